@@ -7,9 +7,12 @@ import time
 import pwd
 import grp
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import List
-from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import zip_longest
+from operator import attrgetter
+from typing import List, Optional
 
 class ColorMode(Enum):
     AUTO = 'auto'
@@ -25,17 +28,44 @@ class TimeMode(Enum):
     MTIME = 'mtime'
     MODIFICATION = 'modification'
 
-@dataclass(frozen=True)
+_uid_cache: dict[int, str] = {}
+_gid_cache: dict[int, str] = {}
+
+# Fewer sibling subdirectories than this are not worth handing to the pool
+PARALLEL_SCAN_THRESHOLD = 4
+
+# LS_BATCH_STAT=1 spreads the stat calls of directories with at least
+# BATCH_STAT_THRESHOLD entries across the pool, BATCH_STAT_CHUNK per task
+BATCH_STAT = os.environ.get('LS_BATCH_STAT') == '1'
+BATCH_STAT_THRESHOLD = 1024
+BATCH_STAT_CHUNK = 256
+
 class LsEntry:
-    name: str
-    full_path: str
-    stat_result: os.stat_result
-    is_dir: bool = field(init=False)
-    is_symlink: bool = field(init=False)
+    __slots__ = ('name', 'full_path', 'stat_result', 'is_dir', 'is_symlink')
 
-    def __post_init__(self):
-        object.__setattr__(self, 'is_dir', bool(self.stat_result.st_mode & stat.S_IFDIR))
-        object.__setattr__(self, 'is_symlink', bool(self.stat_result.st_mode & stat.S_IFLNK))
+    def __init__(self, name: str, full_path: str, stat_result: Optional[os.stat_result],
+                 is_dir: Optional[bool] = None, is_symlink: Optional[bool] = None):
+        self.name = name
+        self.full_path = full_path
+        self.stat_result = stat_result  # None when scanned without stat
+        if is_dir is None:
+            is_dir = stat.S_ISDIR(stat_result.st_mode)
+        if is_symlink is None:
+            is_symlink = stat.S_ISLNK(stat_result.st_mode)
+        self.is_dir = is_dir
+        self.is_symlink = is_symlink
+
+    @classmethod
+    def from_dir_entry(cls, de: os.DirEntry, dir_path: str, follow_symlinks: bool = False, with_stat: bool = True) -> 'LsEntry':
+        # DirEntry answers is_dir()/is_symlink() from d_type or its cached stat.
+        # de.path is only the name when the directory was scanned by fd.
+        return cls(
+            name=de.name,
+            full_path=os.path.join(dir_path, de.name),
+            stat_result=de.stat(follow_symlinks=follow_symlinks) if with_stat else None,
+            is_dir=de.is_dir(follow_symlinks=follow_symlinks),
+            is_symlink=not follow_symlinks and de.is_symlink()
+        )
 
 def entry_from_path(path: str, follow_symlinks: bool = False) -> LsEntry:
     if follow_symlinks:
@@ -128,76 +158,75 @@ def parse_arguments(argv: List[str]) -> argparse.Namespace:
     except SystemExit:
         sys.exit(2)
 
+_TYPE_TABLE = {
+    stat.S_IFIFO: 'p',
+    stat.S_IFCHR: 'c',
+    stat.S_IFDIR: 'd',
+    stat.S_IFBLK: 'b',
+    stat.S_IFREG: '-',
+    stat.S_IFLNK: 'l',
+    stat.S_IFSOCK: 's',
+    stat.S_IFDOOR: 'D'
+}
+
+def _build_perm_string(mode: int) -> str:
+    parts = []
+    for r, w, x, special, set_char in (
+        (stat.S_IRUSR, stat.S_IWUSR, stat.S_IXUSR, stat.S_ISUID, 's'),
+        (stat.S_IRGRP, stat.S_IWGRP, stat.S_IXGRP, stat.S_ISGID, 's'),
+        (stat.S_IROTH, stat.S_IWOTH, stat.S_IXOTH, stat.S_ISVTX, 't'),
+    ):
+        parts.append('r' if mode & r else '-')
+        parts.append('w' if mode & w else '-')
+        if mode & special:
+            parts.append(set_char if mode & x else set_char.upper())
+        else:
+            parts.append('x' if mode & x else '-')
+    return ''.join(parts)
+
+# Every combination of the rwx, setuid, setgid and sticky bits
+_PERM_TABLE = [_build_perm_string(m) for m in range(0o7777 + 1)]
+
 def format_permissions(mode: int) -> str:
-    type_char = {
-        stat.S_IFIFO: 'p',
-        stat.S_IFCHR: 'c',
-        stat.S_IFDIR: 'd',
-        stat.S_IFBLK: 'b',
-        stat.S_IFREG: '-',
-        stat.S_IFLNK: 'l',
-        stat.S_IFSOCK: 's',
-        stat.S_IFDOOR: 'D'
-    }.get(stat.S_IFMT(mode), '?')
-    
-    perms = type_char
-    perms += 'r' if mode & stat.S_IRUSR else '-'
-    perms += 'w' if mode & stat.S_IWUSR else '-'
-    user = ''
-    if mode & stat.S_ISUID:
-        user = 's' if mode & stat.S_IXUSR else 'S'
-    else:
-        user = 'x' if mode & stat.S_IXUSR else '-'
-    perms += user
-    
-    perms += 'r' if mode & stat.S_IRGRP else '-'
-    perms += 'w' if mode & stat.S_IWGRP else '-'
-    group = ''
-    if mode & stat.S_ISGID:
-        group = 's' if mode & stat.S_IXGRP else 'S'
-    else:
-        group = 'x' if mode & stat.S_IXGRP else '-'
-    perms += group
-    
-    perms += 'r' if mode & stat.S_IROTH else '-'
-    perms += 'w' if mode & stat.S_IWOTH else '-'
-    other = ''
-    if mode & stat.S_ISVTX:
-        other = 't' if mode & stat.S_IXOTH else 'T'
-    else:
-        other = 'x' if mode & stat.S_IXOTH else '-'
-    perms += other
-    
-    return perms
+    return _TYPE_TABLE.get(stat.S_IFMT(mode), '?') + _PERM_TABLE[stat.S_IMODE(mode)]
+
+SIX_MONTHS = 6 * 30 * 24 * 3600
 
-def format_time(st: os.stat_result, options: argparse.Namespace) -> str:
+@lru_cache(maxsize=4096)
+def cached_strftime(fmt: str, seconds: int) -> str:
+    return time.strftime(fmt, time.localtime(seconds))
+
+def format_time(st: os.stat_result, options: argparse.Namespace, six_months_ago: Optional[float] = None) -> str:
     time_field = options.time_style.value if hasattr(options, 'time_style') else 'mtime'
+    timestamp = getattr(st, f'st_{time_field}')
     if options.full_time:
         fmt = '%Y-%m-%d %H:%M:%S.%f'[:-3]
-        return time.strftime(fmt, time.localtime(getattr(st, f'st_{time_field}')))
+        return cached_strftime(fmt, int(timestamp))
     
-    now = time.time()
-    six_months_ago = now - 6 * 30 * 24 * 3600
+    if six_months_ago is None:
+        six_months_ago = time.time() - SIX_MONTHS
     
-    timestamp = getattr(st, f'st_{time_field}')
     if timestamp >= six_months_ago:
         fmt = '%b %d %H:%M'
     else:
         fmt = '%b %d  %Y'
     
-    return time.strftime(fmt, time.localtime(timestamp))
+    # Neither format shows seconds, so files from the same minute share a cache slot
+    return cached_strftime(fmt, int(timestamp) // 60 * 60)
+
+class _QuoteTable(dict):
+    # Anything past ASCII is quoted; filled in lazily as str.translate asks
+    def __missing__(self, c: int) -> str:
+        quoted = self[c] = f'?\\{c:03o}'
+        return quoted
+
+_QUOTE_TABLE = _QuoteTable({c: c if 32 <= c <= 126 else f'?\\{c:03o}' for c in range(128)})
 
 def quote_name(name: str, quote_control: bool) -> str:
     if not quote_control:
         return name
     
-    result = ''
-    for c in name:
-        if ord(c) < 32 or ord(c) > 126:
-            result += f'?\\{ord(c):03o}'
-        else:
-            result += c
-    return result
+    return name.translate(_QUOTE_TABLE)
 
 def classify_append(entry: LsEntry, options: argparse.Namespace) -> str:
     if not options.classify:
@@ -220,15 +249,23 @@ def get_user_group(entry: LsEntry, options: argparse.Namespace) -> tuple[str, st
     if options.numeric_uid_gid:
         return str(entry.stat_result.st_uid), str(entry.stat_result.st_gid)
     
-    try:
-        user = pwd.getpwuid(entry.stat_result.st_uid).pw_name
-    except KeyError:
-        user = str(entry.stat_result.st_uid)
+    uid = entry.stat_result.st_uid
+    user = _uid_cache.get(uid)
+    if user is None:
+        try:
+            user = pwd.getpwuid(uid).pw_name
+        except KeyError:
+            user = str(uid)
+        _uid_cache[uid] = user
     
-    try:
-        group = grp.getgrgid(entry.stat_result.st_gid).gr_name
-    except KeyError:
-        group = str(entry.stat_result.st_gid)
+    gid = entry.stat_result.st_gid
+    group = _gid_cache.get(gid)
+    if group is None:
+        try:
+            group = grp.getgrgid(gid).gr_name
+        except KeyError:
+            group = str(gid)
+        _gid_cache[gid] = group
     
     if options.omit_group:
         group = ''
@@ -252,37 +289,50 @@ def format_entries(entries: list[LsEntry], options: argparse.Namespace, term_wid
     
     max_name_len = max(len(e.name) for e in entries)
     
+    # Read the option flags once rather than per entry
+    quote_control = options.hide_control_chars
+    classify = options.classify
+    omit_group = options.omit_group
+    human_readable = options.human_readable
+    show_blocks = options.size
+    
+    def display_name(e: LsEntry) -> str:
+        name = quote_name(e.name, quote_control)
+        return name + classify_append(e, options) if classify else name
+    
     if options.long_format:
-        # Calculate column widths for alignment
-        max_nlink = max(len(str(e.stat_result.st_nlink)) for e in entries)
-        max_user = max(len(get_user_group(e, options)[0]) for e in entries)
-        max_group = max(len(get_user_group(e, options)[1]) for e in entries if not options.omit_group) if not options.omit_group else 0
-        max_size = max(len(format_size(e.stat_result.st_size if not options.size else e.stat_result.st_blocks * 512, options.human_readable)) for e in entries)
-        max_time = max(len(format_time(e.stat_result, options)) for e in entries)
-        
-        lines = []
+        # Format every field once, then size the columns from the results
+        six_months_ago = time.time() - SIX_MONTHS
+        rows = []
         for e in entries:
-            perms = format_permissions(e.stat_result.st_mode)
-            nlink = str(e.stat_result.st_nlink)
+            st = e.stat_result
             user, group = get_user_group(e, options)
-            
-            if options.size:
-                size = format_size(e.stat_result.st_blocks * 512, options.human_readable)
-            else:
-                size = format_size(e.stat_result.st_size, options.human_readable)
-            
-            mtime = format_time(e.stat_result, options)
-            
-            display_name = quote_name(e.name, options.hide_control_chars)
-            suffix = classify_append(e, options)
-            name_part = display_name + suffix
-            
+            size = st.st_blocks * 512 if show_blocks else st.st_size
+            rows.append((
+                format_permissions(st.st_mode),
+                str(st.st_nlink),
+                user,
+                group,
+                format_size(size, human_readable),
+                format_time(st, options, six_months_ago),
+                display_name(e),
+            ))
+        
+        _, nlinks, users, groups, sizes, times, _ = zip(*rows)
+        max_nlink = max(map(len, nlinks))
+        max_user = max(map(len, users))
+        max_group = max(map(len, groups))
+        max_size = max(map(len, sizes))
+        max_time = max(map(len, times))
+        
+        lines = []
+        for perms, nlink, user, group, size, mtime, name_part in rows:
             nlink_part = nlink.rjust(max_nlink)
             user_part = user.rjust(max_user)
             size_part = size.rjust(max_size)
             time_part = mtime.rjust(max_time)
             
-            if options.omit_group:
+            if omit_group:
                 line = f"{perms} {nlink_part} {user_part}  {size_part} {time_part} {name_part}"
             else:
                 group_part = group.rjust(max_group)
@@ -291,12 +341,7 @@ def format_entries(entries: list[LsEntry], options: argparse.Namespace, term_wid
         return lines
     
     elif options.one_per_line:
-        lines = []
-        for e in entries:
-            display_name = quote_name(e.name, options.hide_control_chars)
-            suffix = classify_append(e, options)
-            lines.append(display_name + suffix)
-        return lines
+        return [display_name(e) for e in entries]
     
     else:
         col_width = max_name_len + 2
@@ -304,56 +349,175 @@ def format_entries(entries: list[LsEntry], options: argparse.Namespace, term_wid
         nrows = (len(entries) + ncols - 1) // ncols
         
         if options.C:
-            chunked = [entries[i::ncols] for i in range(ncols)]
+            # Fill columns top to bottom, then transpose them into rows
+            columns = [entries[i*nrows:(i+1)*nrows] for i in range(ncols)]
+            rows = zip_longest(*columns)
         else:
-            chunked = [entries[i*ncols:(i+1)*ncols] for i in range(nrows)]
+            rows = (entries[i*ncols:(i+1)*ncols] for i in range(nrows))
         
-        lines = []
-        for row in chunked:
-            parts = []
-            for e in row:
-                display_name = quote_name(e.name, options.hide_control_chars)
-                suffix = classify_append(e, options)
-                parts.append((display_name + suffix).ljust(col_width))
-            lines.append(' '.join(parts))
-        return lines
+        return [' '.join(display_name(e).ljust(col_width) for e in row if e is not None) for row in rows]
 
-def scan_directory(dir_path: str, show_all: bool, almost_all: bool, follow_symlinks: bool, ignore_backups: bool, quote_control: bool) -> List[LsEntry]:
-    names = os.listdir(dir_path)
-    filtered_names = [n for n in names if show_all or (not n.startswith('.') or (almost_all and n not in {'.', '..'})) and (not ignore_backups or not n.endswith('~'))]
+def needs_stat(options: argparse.Namespace) -> bool:
+    # Names and d_type are enough unless a field, sort key or -F suffix reads stat
+    if options.long_format or options.classify or options.inode or options.size or options.dereference:
+        return True
+    sorting = not (options.no_sort or options.f)
+    return sorting and (options.t or options.c or options.u or options.S)
+
+def stat_dir_entries(dir_entries: List[os.DirEntry], dir_path: str, follow_symlinks: bool, with_stat: bool = True) -> List[LsEntry]:
     entries = []
-    for name in filtered_names:
-        full_path = os.path.join(dir_path, name)
+    for de in dir_entries:
         try:
-            entries.append(entry_from_path(full_path, follow_symlinks))
+            entries.append(LsEntry.from_dir_entry(de, dir_path, follow_symlinks, with_stat))
         except OSError:
             pass  # skip unreadable
     return entries
 
+def scan_directory(dir_path: str, show_all: bool, almost_all: bool, follow_symlinks: bool, ignore_backups: bool, quote_control: bool,
+                   with_stat: bool = True, pool: Optional[ThreadPoolExecutor] = None, dir_fd: Optional[int] = None) -> List[LsEntry]:
+    # Scanning an open directory fd makes each stat an fstatat relative to it
+    with os.scandir(dir_path if dir_fd is None else dir_fd) as it:
+        if show_all and not ignore_backups:
+            dir_entries = list(it)  # nothing to filter (-a / -f)
+        else:
+            # scandir never yields '.' or '..', so -a and -A only differ in name
+            # -B is an ignore pattern, not a --hide pattern, so GNU ls applies it
+            # even under -a/-f: `ls -aB` omits both a~ and .a~
+            dir_entries = [de for de in it
+                           if (show_all or almost_all or not de.name.startswith('.'))
+                           and (not ignore_backups or not de.name.endswith('~'))]
+    
+    if pool is None or not with_stat or len(dir_entries) < BATCH_STAT_THRESHOLD:
+        return stat_dir_entries(dir_entries, dir_path, follow_symlinks, with_stat)
+    
+    # stat() releases the GIL, so the chunks' syscalls overlap
+    chunks = [dir_entries[i:i + BATCH_STAT_CHUNK] for i in range(0, len(dir_entries), BATCH_STAT_CHUNK)]
+    entries = []
+    for chunk_entries in pool.map(stat_dir_entries, chunks, [dir_path] * len(chunks), [follow_symlinks] * len(chunks)):
+        entries.extend(chunk_entries)
+    return entries
+
 def sort_entries(entries: List[LsEntry], options) -> List[LsEntry]:
     if options.no_sort or options.f:
         return entries  # no sort
     
     time_field = options.time_style.value if hasattr(options, 'time_style') else 'mtime'
     
-    base_key = (
-        lambda e: getattr(e.stat_result, f'st_{time_field}') if options.t
-        else (getattr(e.stat_result, 'st_ctime') if options.c
-              else (getattr(e.stat_result, 'st_atime') if options.u
-                    else (e.stat_result.st_size if options.S
-                          else (os.path.splitext(e.name)[1] + e.name if options.sort_extension
-                                else e.name)))))
+    if options.t:
+        key = attrgetter(f'stat_result.st_{time_field}')
+    elif options.c:
+        key = attrgetter('stat_result.st_ctime')
+    elif options.u:
+        key = attrgetter('stat_result.st_atime')
+    elif options.S:
+        key = attrgetter('stat_result.st_size')
+    elif options.sort_extension:
+        key = lambda e: os.path.splitext(e.name)[1] + e.name
+    else:
+        key = attrgetter('name')
+    
+    sorted_entries = sorted(entries, key=key, reverse=options.reverse)
     
     if options.group_directories_first:
-        def dir_key(e):
-            return (0 if e.is_dir else 1, base_key(e))
-        key = dir_key
-    else:
-        key = base_key
+        # Stable partition keeps the sort order within each group
+        dirs = [e for e in sorted_entries if e.is_dir]
+        others = [e for e in sorted_entries if not e.is_dir]
+        return dirs + others
+    return sorted_entries
+
+def read_directory(dir_path: str, options: argparse.Namespace, pool: Optional[ThreadPoolExecutor] = None,
+                   dir_fd: Optional[int] = None) -> List[LsEntry]:
+    entries = scan_directory(dir_path, options.all or options.f, options.almost_all, options.dereference, options.ignore_backups, options.hide_control_chars,
+                             needs_stat(options), pool, dir_fd)
+    return sort_entries(entries, options)
+
+def open_subdirectory(name: str, dir_fd: int, follow_symlinks: bool) -> int:
+    flags = os.O_RDONLY | os.O_DIRECTORY
+    if not follow_symlinks:
+        flags |= os.O_NOFOLLOW
+    return os.open(name, flags, dir_fd=dir_fd)
+
+def scan_subdirectory(name: str, path: str, dir_fd: int, options: argparse.Namespace,
+                      pool: Optional[ThreadPoolExecutor] = None) -> tuple[Optional[List[LsEntry]], Optional[OSError]]:
+    # Returns (entries, None) or (None, error); the fd is closed again so that
+    # prefetching many siblings cannot run out of descriptors
+    try:
+        fd = open_subdirectory(name, dir_fd, options.dereference)
+    except OSError as err:
+        err.filename = path
+        return None, err
+    try:
+        return read_directory(path, options, pool, fd), None
+    except OSError as err:
+        err.filename = path
+        return None, err
+    finally:
+        os.close(fd)
+
+def list_tree(top: str, options: argparse.Namespace, term_width: int, color_enabled: bool,
+              pool: Optional[ThreadPoolExecutor] = None) -> None:
+    # Each directory is scanned once through its own fd; those entries are both
+    # printed and used to pick the subdirectories to descend into, which are
+    # opened relative to the parent's fd instead of by path from the root.
+    errors = []
+    batch_pool = pool if BATCH_STAT else None
+    
+    def visit(path: str, fd: int, entries: List[LsEntry]) -> None:
+        print(f"{path}:")
+        lines = format_entries(entries, options, term_width, color_enabled)
+        print('\n'.join(lines))
+        
+        subdirs = [e.name for e in entries if e.is_dir]
+        paths = [os.path.join(path, name) for name in subdirs]
+        # Scan siblings concurrently, but recurse and print on this thread so
+        # output order matches the sequential listing; prefetch tasks stat
+        # sequentially so they never wait on the pool they run in.
+        if pool is not None and len(subdirs) >= PARALLEL_SCAN_THRESHOLD:
+            scans = pool.map(scan_subdirectory, subdirs, paths, [fd] * len(subdirs), [options] * len(subdirs))
+        else:
+            scans = (scan_subdirectory(name, sub_path, fd, options, batch_pool)
+                     for name, sub_path in zip(subdirs, paths))
+        for name, sub_path, (sub_entries, err) in zip(subdirs, paths, scans):
+            print()
+            if err is not None:
+                print(f"ls: cannot open directory '{err.filename}': {err.strerror}", file=sys.stderr)
+                errors.append(err)
+                continue
+            if not any(e.is_dir for e in sub_entries):
+                visit(sub_path, -1, sub_entries)  # a leaf needs no fd
+                continue
+            try:
+                sub_fd = open_subdirectory(name, fd, options.dereference)
+            except OSError as err:
+                err.filename = sub_path
+                print(f"ls: cannot open directory '{sub_path}': {err.strerror}", file=sys.stderr)
+                errors.append(err)
+                continue
+            try:
+                visit(sub_path, sub_fd, sub_entries)
+            finally:
+                os.close(sub_fd)
     
-    return sorted(entries, key=key, reverse=options.reverse)
+    try:
+        top_fd = os.open(top, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            top_entries = read_directory(top, options, batch_pool, top_fd)
+        except OSError:
+            os.close(top_fd)
+            raise
+    except OSError as err:
+        print(f"ls: cannot open directory '{top}': {err.strerror}", file=sys.stderr)
+        raise
+    try:
+        visit(top, top_fd, top_entries)
+    finally:
+        os.close(top_fd)
+    
+    if errors:
+        raise errors[0]
 
-def list_path(path: str, options: argparse.Namespace, term_width: int, color_enabled: bool) -> None:
+def list_path(path: str, options: argparse.Namespace, term_width: int, color_enabled: bool,
+              pool: Optional[ThreadPoolExecutor] = None) -> None:
     abspath = os.path.abspath(path)
     
     try:
@@ -369,18 +533,13 @@ def list_path(path: str, options: argparse.Namespace, term_width: int, color_ena
         entry = entry_from_path(abspath, options.dereference)
         lines = format_entries([entry], options, term_width, color_enabled)
         print('\n'.join(lines))
+    elif options.recursive:
+        list_tree(abspath, options, term_width, color_enabled, pool)
     else:
         print(f"{abspath}:")
-        entries = scan_directory(abspath, options.all or options.f, options.almost_all, options.dereference, options.ignore_backups, options.hide_control_chars)
-        sorted_entries = sort_entries(entries, options)
+        sorted_entries = read_directory(abspath, options, pool)
         lines = format_entries(sorted_entries, options, term_width, color_enabled)
         print('\n'.join(lines))
-        
-        if options.recursive:
-            subdirs = [e for e in sorted_entries if e.is_dir]
-            for subdir_entry in subdirs:
-                print()
-                list_path(os.path.join(abspath, subdir_entry.name), options, term_width, color_enabled)
 
 def main() -> int:
     try:
@@ -408,14 +567,22 @@ def main() -> int:
     if options.width is not None:
         term_width = options.width
 
+    pool = None
+    if BATCH_STAT or options.recursive:
+        pool = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4))
+
     error_occurred = False
-    for i, path in enumerate(options.paths):
-        try:
-            if i > 0:
-                print()
-            list_path(path, options, term_width, color_enabled)
-        except Exception:
-            error_occurred = True
+    try:
+        for i, path in enumerate(options.paths):
+            try:
+                if i > 0:
+                    print()
+                list_path(path, options, term_width, color_enabled, pool)
+            except Exception:
+                error_occurred = True
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
 
     return 1 if error_occurred else 0
 
@@ -4,6 +4,7 @@ import sys
 import subprocess
 import readline
 import glob
+import fnmatch
 import re
 import signal
 import atexit
@@ -27,31 +28,84 @@ def default_prompt():
 
 env['prompt'] = default_prompt
 
+prompt_source = None
+prompt_func = None
+
 def get_prompt():
+    global prompt_source, prompt_func
     p = env.get('prompt', '$ ')
-    if callable(p):
-        return p()
-    return p
+    # Only re-dispatch when env['prompt'] has been replaced
+    if p is not prompt_source:
+        prompt_source = p
+        prompt_func = p if callable(p) else lambda: p
+    return prompt_func()
+
+VAR_RE = re.compile(r'\$([a-zA-Z_]\w*)')
+
+def expand_var(m):
+    return str(env.get(m.group(1), ''))
 
 def expand_arg(arg):
+    if '$' not in arg and not arg.startswith('~'):
+        return arg
     arg = os.path.expanduser(arg)
-    def repl(m):
-        return str(env.get(m.group(1), ''))
-    arg = re.sub(r'\$([a-zA-Z_]\w*)', repl, arg)
-    return arg
+    return VAR_RE.sub(expand_var, arg)
+
+def has_glob(s):
+    return '*' in s or '?' in s or '[' in s
 
 def glob_args(args):
     new_args = []
+    listings = {}  # each directory is read once for all patterns in it
     for arg in args:
-        gs = glob.glob(arg)
+        if not has_glob(arg):
+            new_args.append(arg)
+            continue
+        dirname, pattern = os.path.split(arg)
+        if has_glob(dirname):
+            gs = glob.glob(arg)
+        else:
+            names = listings.get(dirname)
+            if names is None:
+                try:
+                    with os.scandir(dirname or '.') as it:
+                        names = [de.name for de in it]
+                except OSError:
+                    names = []
+                listings[dirname] = names
+            if not pattern.startswith('.'):
+                names = [n for n in names if not n.startswith('.')]
+            gs = [os.path.join(dirname, n) for n in fnmatch.filter(names, pattern)]
         if gs:
             new_args.extend(gs)
         else:
             new_args.append(arg)
     return new_args
 
-def execute_cd(first_part):
-    parts = shlex.split(first_part)
+# A word is a run of unquoted text and quoted strings; (.) catches an unbalanced quote
+TOKEN_RE = re.compile(r'''((?:[^ \t\r\n'"\\]+|"[^"\\]*"|'[^']*')+)|[ \t\r\n]+|(.)''', re.DOTALL)
+QUOTED_RE = re.compile(r'"([^"\\]*)"|\'([^\']*)\'')
+
+def unquote(m):
+    return m.group(1) if m.group(1) is not None else m.group(2)
+
+def split_words(s):
+    # shlex is pure Python; input without backslashes is tokenized by the regex
+    # instead, leaving escapes and unbalanced quotes (which raise) to shlex
+    if '\\' not in s:
+        words = []
+        for m in TOKEN_RE.finditer(s):
+            if m.group(2) is not None:
+                break
+            if m.group(1) is not None:
+                words.append(m.group(1))
+        else:
+            if '"' in s or "'" in s:
+                words = [QUOTED_RE.sub(unquote, w) for w in words]
+            return words
+    return shlex.split(s)
+
+def execute_cd(parts):
     arg = ''
     if len(parts) > 1:
         arg = expand_arg(parts[1])
@@ -80,8 +134,7 @@ def execute_cd(first_part):
 def execute_pwd():
     print(os.getcwd())
 
-def execute_exit(first_part):
-    parts = shlex.split(first_part)
+def execute_exit(parts):
     code = 0
     if len(parts) > 1:
         try:
@@ -90,8 +143,7 @@ def execute_exit(first_part):
             code = 0
     sys.exit(code)
 
-def execute_echo(first_part):
-    parts = shlex.split(first_part)
+def execute_echo(parts):
     args = parts[1:]
     no_nl = False
     if args and args[0] == '-n':
@@ -122,7 +174,7 @@ def parse_command(command):
     parts = [p.strip() for p in command.split('|')]
     pipeline = []
     for part in parts:
-        tokens = shlex.split(part)
+        tokens = split_words(part)
         cmd_args = []
         redirects = {}
         i = 0
@@ -151,17 +203,42 @@ def parse_command(command):
         pipeline.append((cmd_args, redirects))
     return pipeline
 
+_path_cache = {}
+_path_cache_key = None
+
+# Rebuilt whenever a PATH directory (or env['path'] itself) changes
+def refresh_path_cache():
+    global _path_cache, _path_cache_key
+    key = []
+    for p in env['path']:
+        try:
+            key.append((os.path.abspath(p), os.stat(p).st_mtime_ns))
+        except OSError:
+            key.append((p, None))
+    key = tuple(key)
+    if key == _path_cache_key:
+        return
+    cache = {}
+    for p in env['path']:
+        try:
+            with os.scandir(p) as it:
+                for de in it:
+                    # Earlier PATH entries win, as with a sequential search
+                    if de.name not in cache and de.is_file() and os.access(de.path, os.X_OK):
+                        cache[de.name] = os.path.join(p, de.name)
+        except OSError:
+            pass
+    _path_cache = cache
+    _path_cache_key = key
+
 def find_command(cmd):
     cmd_path = None
     if '/' in cmd or cmd.startswith('.'):
         if os.path.isfile(cmd) and os.access(cmd, os.X_OK):
             cmd_path = cmd
     else:
-        for p in env['path']:
-            candidate = os.path.join(p, cmd)
-            if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
-                cmd_path = candidate
-                break
+        refresh_path_cache()
+        cmd_path = _path_cache.get(cmd)
         if not cmd_path:
             py_candidate = f"{cmd}.py"
             for p in [os.getcwd()] + env['path']:
@@ -252,19 +329,19 @@ def execute_line(line):
         if not first_part:
             continue
         try:
-            parts = shlex.split(first_part)
+            parts = split_words(first_part)
             builtin_cmd = parts[0]
         except:
             builtin_cmd = ''
         if is_builtin(builtin_cmd):
             if builtin_cmd == 'cd':
-                execute_cd(first_part)
+                execute_cd(parts)
             elif builtin_cmd == 'pwd':
                 execute_pwd()
             elif builtin_cmd == 'exit':
-                execute_exit(first_part)
+                execute_exit(parts)
             elif builtin_cmd == 'echo':
-                execute_echo(first_part)
+                execute_echo(parts)
             elif builtin_cmd == 'jobs':
                 execute_jobs()
             continue
@@ -276,13 +353,8 @@ def completer(text, state):
         matches = []
         builtins_list = ['cd', 'pwd', 'exit', 'echo', 'jobs', 'history', 'source']
         matches.extend([b for b in builtins_list if b.startswith(text)])
-        for p in env['path']:
-            try:
-                exes = [f for f in os.listdir(p)
-                        if f.startswith(text) and os.access(os.path.join(p, f), os.X_OK)]
-                matches.extend(exes)
-            except (PermissionError, FileNotFoundError):
-                pass
+        refresh_path_cache()
+        matches.extend([f for f in _path_cache if f.startswith(text)])
         is_path_like = '/' in text or text.startswith('~')
         if not is_path_like:
             try:
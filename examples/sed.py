@@ -1,80 +1,99 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Iterator, List, Dict, Any, Optional, TypedDict, Union, Iterable
-from enum import Enum
+from typing import BinaryIO, Callable, Iterator, List, Dict, Any, Optional, Union, Iterable
 import sys
 import re
 import argparse
 import os
 import shutil
+from itertools import repeat
+from functools import lru_cache
+from collections import Counter
 from pathlib import Path
-from io import TextIOWrapper
-
-class SedCommandType(Enum):
-    BRANCH = 'b'
-    COMMENT = '#'
-    DELETE = 'd'
-    DELETE_FIRST_LINE = 'D'
-    EQUAL = '='
-    GLOBAL_SUB = 'g'
-    HOLD = 'h'
-    HOLD_APPEND = 'H'
-    INSERT = 'i'
-    LABEL = ':'
-    NEXT = 'n'
-    NEXT_READ = 'N'
-    PRINT = 'p'
-    PRINT_FIRST_LINE = 'P'
-    QUIT = 'q'
-    QUIT_SILENT = 'Q'
-    READ_FILE = 'r'
-    READ_FILE_SILENT = 'R'
-    SUBSTITUTE = 's'
-    TEST = 't'
-    TEST_BRANCH = 'T'
-    EXCHANGE = 'x'
-    TRANSLIT = 'y'
-    WRITE = 'w'
-    WRITE_FIRST_LINE = 'W'
-    CHANGE = 'c'
-    SWAPCASE = 'l'
+
+INPUT_BUFFER_SIZE = 1 << 20
+OUTPUT_CHUNK_SIZE = 1 << 16
+
+_ADDR = r'\d+~\d+|\d+|/[^/\n]+/|\$'
+SCRIPT_TOK = re.compile(
+    rf'^[ \t]*(?:(?P<addr1>{_ADDR})(?:,(?P<addr2>{_ADDR}))?[ \t]*)?'
+    r'(?P<cmd>\S)?(?P<rest>.*)$',
+    re.MULTILINE)
+
+# Command tags are the ordinal of the command character.
+CMD_BRANCH = ord('b')
+CMD_COMMENT = ord('#')
+CMD_DELETE = ord('d')
+CMD_DELETE_FIRST_LINE = ord('D')
+CMD_EQUAL = ord('=')
+CMD_GLOBAL_SUB = ord('g')
+CMD_HOLD = ord('h')
+CMD_HOLD_APPEND = ord('H')
+CMD_INSERT = ord('i')
+CMD_LABEL = ord(':')
+CMD_NEXT = ord('n')
+CMD_NEXT_READ = ord('N')
+CMD_PRINT = ord('p')
+CMD_PRINT_FIRST_LINE = ord('P')
+CMD_QUIT = ord('q')
+CMD_QUIT_SILENT = ord('Q')
+CMD_READ_FILE = ord('r')
+CMD_READ_FILE_SILENT = ord('R')
+CMD_SUBSTITUTE = ord('s')
+CMD_TEST = ord('t')
+CMD_TEST_BRANCH = ord('T')
+CMD_EXCHANGE = ord('x')
+CMD_TRANSLIT = ord('y')
+CMD_WRITE = ord('w')
+CMD_WRITE_FIRST_LINE = ord('W')
+CMD_CHANGE = ord('c')
+CMD_SWAPCASE = ord('l')
+
+COMMAND_CHARS = frozenset('b#dD=ghHi:nNpPqQrRstTxywWcl')
 
 @dataclass
 class SedScript:
     commands: List[SedCommand] = field(default_factory=list)
 
-SedCommand = TypedDict('SedCommand', {
-    'addr1': Optional[Union[int, str]],
-    'addr2': Optional[Union[int, str]],
-    'cmd_type': SedCommandType,
-    'args': Dict[str, Any]
-})
+# Addresses are resolved at parse time into tagged tuples:
+# ('LINE', n), ('LAST',), ('REGEX', pattern) or ('STEP', start, step).
+Address = Optional[tuple]
+
+class SedCommand:
+    __slots__ = ('addr1', 'addr2', 'cmd_type', 'args',
+                 'pattern_re', 'replacement', 'count', 'flags', 'target')
+    
+    def __init__(self, addr1: Address, addr2: Address, 
+                 cmd_type: int, args: Optional[Dict[str, Any]] = None,
+                 pattern_re: Optional[re.Pattern] = None, 
+                 replacement: bytes = b'', count: int = 0, flags: str = ''):
+        self.addr1 = addr1
+        self.addr2 = addr2
+        self.cmd_type = cmd_type
+        self.args: Dict[str, Any] = args if args is not None else {}
+        self.pattern_re = pattern_re
+        self.replacement = replacement
+        self.count = count
+        self.flags = flags
+        self.target: Optional[int] = None
 
 class SedPatternSpace:
+    __slots__ = ('pattern_space', 'hold_space', 'substituted', 
+                 'line_num', 'last_line_num')
+    
     def __init__(self):
-        self.pattern_space: str = ''
-        self.hold_space: str = ''
+        self.pattern_space: bytes = b''
+        self.hold_space: bytes = b''
         self.substituted: bool = False
         self.line_num: int = 0
         self.last_line_num: int = 0
 
-class RegexMatcher:
-    def __init__(self, extended: bool = False):
-        self.extended = extended
-        self.patterns: Dict[str, re.Pattern] = {}
-    
-    def compile(self, pattern: str) -> re.Pattern:
-        if pattern in self.patterns:
-            return self.patterns[pattern]
-        flags = re.MULTILINE
-        if self.extended:
-            flags |= re.VERBOSE
-        regex = re.compile(pattern, flags)
-        self.patterns[pattern] = regex
-        return regex
-    
-    def match(self, pattern: str, string: str) -> re.Match | None:
-        return self.compile(pattern).match(string)
+@lru_cache(maxsize=None)
+def compile_pattern(pattern: str, extended: bool = False) -> re.Pattern:
+    flags = re.MULTILINE
+    if extended:
+        flags |= re.VERBOSE
+    return re.compile(pattern.encode('utf-8'), flags)
 
 class SedOptions:
     def __init__(self):
@@ -89,119 +108,219 @@ class SedOptions:
         self.line_wrap: int = 80
         self.follow_symlinks: bool = False
 
-def parse_address(addr: str, line_num: int, pattern_space: str, 
-                 matcher: RegexMatcher, last_line_num: int) -> Optional[bool]:
+# An op returns None to fall through to the next command or the index of
+# the command to jump to. END_CYCLE jumps past the end of the script;
+# DELETE_CYCLE does too but also skips the autoprint.
+Op = Callable[[SedPatternSpace, bytearray], Optional[int]]
+END_CYCLE = sys.maxsize - 1
+DELETE_CYCLE = sys.maxsize
+
+def make_shared_regex_test(pattern: re.Pattern) -> Callable[[SedPatternSpace], bool]:
+    """Remember the last result, for patterns that several commands test."""
+    search = pattern.search
+    last_space = None
+    last_result = False
+    def test(ps):
+        nonlocal last_space, last_result
+        space = ps.pattern_space
+        if space is not last_space:
+            last_space = space
+            last_result = search(space) is not None
+        return last_result
+    return test
+
+def make_address_test(addr: Address, 
+                      shared_tests: Optional[Dict[re.Pattern, Callable]] = None
+                      ) -> Optional[Callable[[SedPatternSpace], bool]]:
     if addr is None:
         return None
-    if isinstance(addr, int):
-        return line_num == addr
-    elif addr == '$':
-        return line_num == last_line_num
-    elif addr.startswith('/'):
-        match = matcher.match(addr[1:-1], pattern_space)
-        return bool(match)
-    elif addr.isdigit():
-        return line_num == int(addr)
-    elif '~' in addr:
-        start, step = map(int, addr.split('~'))
-        return (line_num - start) % step == 0
+    kind = addr[0]
+    if kind == 'LINE':
+        n = addr[1]
+        return lambda ps: ps.line_num == n
+    elif kind == 'REGEX':
+        if shared_tests and addr[1] in shared_tests:
+            return shared_tests[addr[1]]
+        search = addr[1].search
+        return lambda ps: search(ps.pattern_space) is not None
+    elif kind == 'LAST':
+        return lambda ps: ps.line_num == ps.last_line_num
+    elif kind == 'STEP':
+        start, step = addr[1], addr[2]
+        return lambda ps: (ps.line_num - start) % step == 0
     return None
 
-def matches_command(ps: SedPatternSpace, cmd: SedCommand, 
-                   matcher: RegexMatcher) -> bool:
-    addr1_match = parse_address(cmd['addr1'], ps.line_num, ps.pattern_space, 
-                               matcher, ps.last_line_num)
-    addr2_match = parse_address(cmd['addr2'], ps.line_num, ps.pattern_space, 
-                               matcher, ps.last_line_num)
-    
-    if cmd['addr1'] is None and cmd['addr2'] is None:
-        return True
-    if addr1_match is True:
-        return True
-    if addr1_match is False:
-        return False
-    if addr2_match is not None:
-        return addr2_match
-    return True
-
-def execute_command(ps: SedPatternSpace, cmd: SedCommand, 
-                   script: SedScript, options: SedOptions, 
-                   labels: Dict[str, int], output: List[str], 
-                   input_file: Optional[TextIOWrapper] = None) -> bool:
-    if not matches_command(ps, cmd, RegexMatcher(options.extended_regex)):
-        return True
-    
-    cmd_type = cmd['cmd_type']
-    
-    if cmd_type == SedCommandType.COMMENT:
-        return True
-    elif cmd_type == SedCommandType.LABEL:
-        labels[cmd['args'].get('label', '')] = 0
-        return True
-    elif cmd_type == SedCommandType.BRANCH:
-        label = cmd['args'].get('label', '0')
-        if label in labels:
-            return False
-        return True
-    elif cmd_type == SedCommandType.DELETE:
-        ps.pattern_space = ''
-        return False
-    elif cmd_type == SedCommandType.DELETE_FIRST_LINE:
-        if '\n' in ps.pattern_space:
-            ps.pattern_space = ps.pattern_space.split('\n', 1)[1]
-        else:
-            ps.pattern_space = ''
-        return False
-    elif cmd_type == SedCommandType.PRINT:
-        output.append(ps.pattern_space + '\n')
-        return True
-    elif cmd_type == SedCommandType.EQUAL:
-        output.append(f"{ps.line_num}\n")
-        return True
-    elif cmd_type == SedCommandType.NEXT:
-        return False
-    elif cmd_type == SedCommandType.INSERT:
-        output.append(cmd['args']['text'])
-        return True
-    elif cmd_type == SedCommandType.QUIT:
+def make_range_test(addr2: Address, start: Callable[[SedPatternSpace], bool],
+                    end: Callable[[SedPatternSpace], bool]) -> Callable[[SedPatternSpace], bool]:
+    """Match addr1,addr2 inclusively, testing only the edge that can change."""
+    if addr2[0] == 'LINE':
+        n = addr2[1]
+        end = lambda ps: ps.line_num >= n
+        end_checked_on_start = True
+    else:
+        end_checked_on_start = False
+    active = False
+    def in_range(ps):
+        nonlocal active
+        if active:
+            if end(ps):
+                active = False
+            return True
+        if start(ps):
+            active = not (end_checked_on_start and end(ps))
+            return True
         return False
-    elif cmd_type == SedCommandType.SUBSTITUTE:
-        matcher = RegexMatcher(options.extended_regex)
-        pat = cmd['args']['pattern']
-        repl = cmd['args']['replacement']
-        flags = cmd['args'].get('flags', '')
-        global_flag = 'g' in flags
-        
-        count = cmd['args'].get('count', 0)
-        if count > 0:
-            result = matcher.compile(pat).sub(repl, ps.pattern_space, count)
-            ps.substituted = result != ps.pattern_space
-            ps.pattern_space = result
-        else:
-            count = 0 if global_flag else 1
-            result = matcher.compile(pat).sub(repl, ps.pattern_space, count)
-            ps.substituted = result != ps.pattern_space
-            ps.pattern_space = result
-        return True
-    elif cmd_type == SedCommandType.HOLD:
-        ps.hold_space = ps.pattern_space
-        return True
-    elif cmd_type == SedCommandType.HOLD_APPEND:
-        ps.hold_space += '\n' + ps.pattern_space
-        return True
-    elif cmd_type == SedCommandType.EXCHANGE:
-        ps.pattern_space, ps.hold_space = ps.hold_space, ps.pattern_space
-        return True
-    elif cmd_type == SedCommandType.TEST:
+    return in_range
+
+def mark_last(records: Iterable[bytes]) -> Iterator[tuple]:
+    it = iter(records)
+    prev = next(it, None)
+    if prev is None:
+        return
+    for cur in it:
+        yield prev, False
+        prev = cur
+    yield prev, True
+
+def uses_last_line(script: SedScript) -> bool:
+    return any(addr is not None and addr[0] == 'LAST'
+               for cmd in script.commands for addr in (cmd.addr1, cmd.addr2))
+
+def _continue(ps: SedPatternSpace, output: bytearray) -> Optional[int]:
+    return None
+
+def _stop(ps: SedPatternSpace, output: bytearray) -> Optional[int]:
+    return END_CYCLE
+
+def _delete(ps: SedPatternSpace, output: bytearray) -> Optional[int]:
+    ps.pattern_space = b''
+    return DELETE_CYCLE
+
+def _delete_first_line(ps: SedPatternSpace, output: bytearray) -> Optional[int]:
+    _, nl, tail = ps.pattern_space.partition(b'\n')
+    ps.pattern_space = tail
+    return 0 if nl else DELETE_CYCLE
+
+def _print(ps: SedPatternSpace, output: bytearray) -> Optional[int]:
+    output += ps.pattern_space
+    output += b'\n'
+
+def _equal(ps: SedPatternSpace, output: bytearray) -> Optional[int]:
+    output += b'%d\n' % ps.line_num
+
+def _hold(ps: SedPatternSpace, output: bytearray) -> Optional[int]:
+    ps.hold_space = ps.pattern_space
+
+def _hold_append(ps: SedPatternSpace, output: bytearray) -> Optional[int]:
+    ps.hold_space = b'\n'.join((ps.hold_space, ps.pattern_space))
+
+def _exchange(ps: SedPatternSpace, output: bytearray) -> Optional[int]:
+    ps.pattern_space, ps.hold_space = ps.hold_space, ps.pattern_space
+
+def branch_target(cmd: SedCommand) -> int:
+    return END_CYCLE if cmd.target is None else cmd.target
+
+def _make_branch(cmd: SedCommand) -> Op:
+    return lambda ps, output, _target=branch_target(cmd): _target
+
+def _make_test(cmd: SedCommand) -> Op:
+    def test_op(ps, output, _target=branch_target(cmd)):
         if ps.substituted:
-            return False
-        return True
-    elif cmd_type == SedCommandType.TEST_BRANCH:
+            ps.substituted = False
+            return _target
+        return None
+    return test_op
+
+def _make_test_branch(cmd: SedCommand) -> Op:
+    def test_branch_op(ps, output, _target=branch_target(cmd)):
         if not ps.substituted:
-            return False
-        return True
-    
-    return True
+            return _target
+        ps.substituted = False
+        return None
+    return test_branch_op
+
+def _make_insert(cmd: SedCommand) -> Op:
+    def insert_op(ps, output, _text=cmd.args['text'].encode('utf-8')):
+        output += _text
+    return insert_op
+
+def _make_substitute(cmd: SedCommand) -> Op:
+    if cmd.pattern_re is None:
+        raise ValueError("malformed `s' command")
+    count = cmd.count
+    if count <= 0:
+        count = 0 if 'g' in cmd.flags else 1
+    def substitute_op(ps, output, _subn=cmd.pattern_re.subn,
+                      _repl=cmd.replacement, _count=count):
+        ps.pattern_space, n = _subn(_repl, ps.pattern_space, _count)
+        if n:
+            ps.substituted = True
+    return substitute_op
+
+_DISPATCH: Dict[int, Op] = {
+    CMD_DELETE: _delete,
+    CMD_DELETE_FIRST_LINE: _delete_first_line,
+    CMD_PRINT: _print,
+    CMD_EQUAL: _equal,
+    CMD_NEXT: _stop,
+    CMD_QUIT: _stop,
+    CMD_HOLD: _hold,
+    CMD_HOLD_APPEND: _hold_append,
+    CMD_EXCHANGE: _exchange,
+}
+
+_FACTORIES: Dict[int, Callable[[SedCommand], Op]] = {
+    CMD_BRANCH: _make_branch,
+    CMD_TEST: _make_test,
+    CMD_TEST_BRANCH: _make_test_branch,
+    CMD_INSERT: _make_insert,
+    CMD_SUBSTITUTE: _make_substitute,
+}
+
+def make_action(cmd: SedCommand) -> Op:
+    factory = _FACTORIES.get(cmd.cmd_type)
+    if factory is not None:
+        return factory(cmd)
+    return _DISPATCH.get(cmd.cmd_type, _continue)
+
+def make_op(cmd: SedCommand,
+            shared_tests: Optional[Dict[re.Pattern, Callable]] = None) -> Op:
+    """Specialize one command into a closure returning the next command index,
+    or None to fall through."""
+    action = make_action(cmd)
+    start = make_address_test(cmd.addr1, shared_tests)
+    end = make_address_test(cmd.addr2, shared_tests)
+    if start is not None and end is not None:
+        test = make_range_test(cmd.addr2, start, end)
+    else:
+        test = start or end
+    if test is None:
+        return action
+    def op(ps, output, _test=test, _action=action):
+        if not _test(ps):
+            return None
+        return _action(ps, output)
+    return op
+
+def compile_script(script: SedScript) -> List[Op]:
+    uses = Counter(addr[1] for cmd in script.commands 
+                   for addr in (cmd.addr1, cmd.addr2)
+                   if addr is not None and addr[0] == 'REGEX')
+    shared_tests = {pattern: make_shared_regex_test(pattern)
+                    for pattern, n in uses.items() if n > 1}
+    return [make_op(cmd, shared_tests) for cmd in script.commands]
+
+def resolve_branch_targets(script: SedScript) -> None:
+    labels = {cmd.args['label']: i for i, cmd in enumerate(script.commands)
+              if cmd.cmd_type == CMD_LABEL}
+    for cmd in script.commands:
+        if cmd.cmd_type in (CMD_BRANCH, CMD_TEST, CMD_TEST_BRANCH):
+            label = cmd.args.get('label')
+            if not label:
+                continue
+            if label not in labels:
+                raise ValueError(f"can't find label for jump to `{label}'")
+            cmd.target = labels[label]
 
 def PySedCore_parse_script(script_str_or_file: Union[str, Path], 
                           extended_regex: bool) -> SedScript:
@@ -212,135 +331,182 @@ def PySedCore_parse_script(script_str_or_file: Union[str, Path],
     else:
         content = script_str_or_file
     
-    lines = content.split('\n')
-    i = 0
-    while i < len(lines):
-        line = lines[i].rstrip()
-        i += 1
+    for m in SCRIPT_TOK.finditer(content):
+        cmd_char = m.group('cmd')
+        rest = m.group('rest').rstrip()
         
-        if not line or line.startswith('#'):
-            cmd = SedCommand(addr1=None, addr2=None, cmd_type=SedCommandType.COMMENT, args={})
+        if cmd_char is None or cmd_char == '#':
+            if m.group('addr1') is not None:
+                raise ValueError(f"missing command: {m.group(0).strip()}")
+            cmd = SedCommand(addr1=None, addr2=None, cmd_type=CMD_COMMENT)
             script.commands.append(cmd)
             continue
         
-        addr1, addr2, cmd_str = parse_addresses(line)
+        addr1 = compile_address(m.group('addr1'), extended_regex)
+        addr2 = compile_address(m.group('addr2'), extended_regex)
         
-        if cmd_str.startswith(':'):
+        if cmd_char == ':':
+            cmd = SedCommand(addr1=addr1, addr2=addr2, 
+                           cmd_type=CMD_LABEL, 
+                           args={'label': rest.strip()})
+        elif cmd_char == 's':
+            cmd = parse_substitute(addr1, addr2, cmd_char + rest, extended_regex)
+        elif cmd_char in 'btT':
+            cmd = SedCommand(addr1=addr1, addr2=addr2, 
+                           cmd_type=ord(cmd_char), 
+                           args={'label': rest.strip()})
+        elif cmd_char == 'i':
             cmd = SedCommand(addr1=addr1, addr2=addr2, 
-                           cmd_type=SedCommandType.LABEL, 
-                           args={'label': cmd_str[1:]})
-        elif cmd_str.startswith('s'):
-            cmd = parse_substitute(addr1, addr2, cmd_str)
+                           cmd_type=CMD_INSERT, 
+                           args={'text': rest.lstrip() + '\n'})
         else:
-            cmd_type = SedCommandType(cmd_str[0])
-            cmd = SedCommand(addr1=addr1, addr2=addr2, cmd_type=cmd_type, args={})
+            if cmd_char not in COMMAND_CHARS:
+                raise ValueError(f"unknown command: `{cmd_char}'")
+            cmd_type = ord(cmd_char)
+            cmd = SedCommand(addr1=addr1, addr2=addr2, cmd_type=cmd_type)
         
         script.commands.append(cmd)
     
+    resolve_branch_targets(script)
     return script
 
-def parse_addresses(line: str) -> tuple[Optional[str], Optional[str], str]:
-    addr1, addr2, cmd = None, None, line
-    if ',' in line:
-        parts = line.split(',', 1)
-        addr1 = parts[0].strip()
-        rest = parts[1]
-        if ',' in rest:
-            addr2, cmd = rest.split(',', 1)
-            addr2, cmd = addr2.strip(), cmd.strip()
-        else:
-            addr2, cmd = None, rest.strip()
-    elif line[0] in '0123456789/$':
-        match = re.match(r'^(\d+|/[^/]+/|\$)(?:,(\d+|/[^/]+/|\$))?\s*([a-z])', line)
-        if match:
-            addr1, addr2, cmd_start = match.groups()
-            cmd = line[match.end():].strip()
-    return addr1, addr2, cmd
-
-def parse_substitute(addr1: Optional[str], addr2: Optional[str], 
-                    cmd_str: str) -> SedCommand:
+def compile_address(addr: Optional[str], extended_regex: bool) -> Address:
+    if addr is None:
+        return None
+    if isinstance(addr, int) or addr.isdigit():
+        return ('LINE', int(addr))
+    if addr == '$':
+        return ('LAST',)
+    if len(addr) > 1 and addr.startswith('/') and addr.endswith('/'):
+        return ('REGEX', compile_pattern(addr[1:-1], extended_regex))
+    if '~' in addr:
+        start, step = map(int, addr.split('~'))
+        if step <= 0:
+            return ('LINE', start)
+        return ('STEP', start, step)
+    return None
+
+def parse_substitute(addr1: Address, addr2: Address,
+                    cmd_str: str, extended_regex: bool = False) -> SedCommand:
     match = re.match(r's(/[^/]+/[^/]+/)(.*)', cmd_str)
     if match:
         pattern_repl, flags = match.groups()
         pattern, repl = pattern_repl[1:-1].split('/', 1)
         return SedCommand(addr1=addr1, addr2=addr2, 
-                         cmd_type=SedCommandType.SUBSTITUTE,
-                         args={'pattern': pattern, 'replacement': repl, 
-                              'flags': flags})
+                         cmd_type=CMD_SUBSTITUTE,
+                         args={'pattern': pattern},
+                         pattern_re=compile_pattern(pattern, extended_regex),
+                         replacement=repl.encode('utf-8'), flags=flags)
     return SedCommand(addr1=addr1, addr2=addr2, 
-                     cmd_type=SedCommandType.SUBSTITUTE, args={})
+                     cmd_type=CMD_SUBSTITUTE)
+
+_REGEX_META = frozenset('.^$*+?{}[]\\|()')
 
-def PySedCore_process(input_streams: List[TextIOWrapper], 
+def is_literal_pattern(pattern: str, extended_regex: bool) -> bool:
+    if not pattern:
+        return False
+    if extended_regex and ('#' in pattern or any(c.isspace() for c in pattern)):
+        return False
+    return _REGEX_META.isdisjoint(pattern)
+
+def is_bulk_substitute(script: SedScript, options: SedOptions) -> bool:
+    """Whether the script can run as whole-block substitutions.
+
+    Only unaddressed s///g commands with literal patterns qualify: such a
+    pattern can neither match the empty string nor span a newline, so one
+    sub() over a block of lines gives the same result as one per line.
+    """
+    if options.quiet or options.null_data or options.unbuffered:
+        return False
+    subs = [cmd for cmd in script.commands if cmd.cmd_type != CMD_COMMENT]
+    return bool(subs) and all(
+        cmd.cmd_type == CMD_SUBSTITUTE and cmd.addr1 is None 
+        and cmd.addr2 is None and cmd.pattern_re is not None 
+        and 'g' in cmd.flags
+        and is_literal_pattern(cmd.args['pattern'], options.extended_regex)
+        for cmd in subs)
+
+def bulk_substitute(input_streams: List[BinaryIO], 
+                    script: SedScript) -> Iterator[bytes]:
+    subs = [(cmd.pattern_re.sub, cmd.replacement) for cmd in script.commands
+            if cmd.cmd_type == CMD_SUBSTITUTE]
+    for stream in input_streams:
+        while True:
+            lines = stream.readlines(INPUT_BUFFER_SIZE)
+            if not lines:
+                break
+            block = b''.join(lines)
+            if not block.endswith(b'\n'):
+                block += b'\n'
+            for sub, repl in subs:
+                block = sub(repl, block)
+            yield block
+
+def PySedCore_process(input_streams: List[BinaryIO], 
                      script: SedScript, 
-                     options: SedOptions) -> Iterator[str]:
+                     options: SedOptions) -> Iterator[bytes]:
+    if is_bulk_substitute(script, options):
+        yield from bulk_substitute(input_streams, script)
+        return
+    
     ps = SedPatternSpace()
-    labels: Dict[str, int] = {}
-    output_buffer: List[str] = []
+    ops = tuple(compile_script(script))
+    n_ops = len(ops)
+    needs_last = uses_last_line(script)
+    output_buffer = bytearray()
+    quiet = options.quiet
+    unbuffered = options.unbuffered
     
     for stream in input_streams:
-        ps.line_num = 0
-        done = False
+        line_num = 0
+        if options.null_data:
+            data = stream.read().rstrip(b'\0')
+            records = [data + b'\0'] if data else []
+        else:
+            records = stream
         
-        while not done:
-            if options.null_data:
-                line = stream.read().rstrip('\0')
-                if not line:
-                    break
-                ps.pattern_space = line + '\0'
-            else:
-                line = stream.readline()
-                if not line:
-                    break
-                ps.pattern_space = line.rstrip('\n')
-            
-            ps.line_num += 1
-            ps.last_line_num = ps.line_num
-            
-            continue_script = True
-            cmd_idx = 0
+        records = mark_last(records) if needs_last else zip(records, repeat(False))
+        
+        for raw, is_last in records:
+            line_num += 1
+            ps.pattern_space = raw.rstrip(b'\n')
+            ps.line_num = line_num
+            ps.last_line_num = line_num if is_last else 0
             
-            while continue_script and cmd_idx < len(script.commands):
-                cmd = script.commands[cmd_idx]
-                continue_script = execute_command(ps, cmd, script, options, 
-                                                labels, output_buffer, stream)
-                
-                if cmd['cmd_type'] == SedCommandType.BRANCH:
-                    label = cmd['args'].get('label', '0')
-                    if label in labels:
-                        cmd_idx = labels[label]
-                    else:
-                        cmd_idx += 1
-                else:
-                    cmd_idx += 1
+            ps.substituted = False
+            i = 0
+            while i < n_ops:
+                next_i = ops[i](ps, output_buffer)
+                i = i + 1 if next_i is None else next_i
             
-            if not options.quiet:
-                output_buffer.append(ps.pattern_space + '\n')
+            if not quiet and i != DELETE_CYCLE:
+                output_buffer += ps.pattern_space
+                output_buffer += b'\n'
             
-            if options.unbuffered:
-                for line in output_buffer:
-                    yield line
-                output_buffer.clear()
+            if unbuffered or len(output_buffer) >= OUTPUT_CHUNK_SIZE:
+                if output_buffer:
+                    yield bytes(output_buffer)
+                    output_buffer.clear()
         
-        if options.separate:
-            for line in output_buffer:
-                yield line
+        if options.separate and output_buffer:
+            yield bytes(output_buffer)
             output_buffer.clear()
     
-    for line in output_buffer:
-        yield line
+    if output_buffer:
+        yield bytes(output_buffer)
 
 def backup_file(filepath: Path, suffix: str) -> None:
     backup_path = filepath.with_suffix(filepath.suffix + suffix)
     shutil.copy2(filepath, backup_path)
 
 def process_in_place(input_file: Path, script: SedScript, options: SedOptions) -> None:
-    with open(input_file, 'r') as infile:
-        result = list(PySedCore_process([TextIOWrapper(infile.buffer, encoding='utf-8')], script, options))
+    with open(input_file, 'rb', buffering=INPUT_BUFFER_SIZE) as infile:
+        result = list(PySedCore_process([infile], script, options))
     
     if options.in_place:
         backup_file(input_file, options.in_place)
     
-    with open(input_file, 'w') as outfile:
+    with open(input_file, 'wb') as outfile:
         outfile.writelines(result)
 
 def PySedCore_main(argv: List[str]) -> int:
@@ -380,10 +546,15 @@ def PySedCore_main(argv: List[str]) -> int:
         input_files = remaining
     
     scripts = []
-    for script_file in script_files:
-        scripts.append(PySedCore_parse_script(Path(script_file), options.extended_regex))
-    for script_str in script_strs:
-        scripts.append(PySedCore_parse_script(script_str, options.extended_regex))
+    try:
+        for script_file in script_files:
+            scripts.append(PySedCore_parse_script(Path(script_file), options.extended_regex))
+        for script_str in script_strs:
+            scripts.append(PySedCore_parse_script(script_str, options.extended_regex))
+    except (ValueError, re.error, OSError) as e:
+        # Unknown commands and labels, addresses without a command, bad regexes
+        print(f"pysed: error: {e}", file=sys.stderr)
+        return 1
     
     if not scripts:
         print("pysed: no script provided", file=sys.stderr)
@@ -391,21 +562,27 @@ def PySedCore_main(argv: List[str]) -> int:
     
     combined_script = scripts[0]
     
-    streams: List[TextIOWrapper] = []
+    streams: List[BinaryIO] = []
     if not input_files:
-        streams.append(TextIOWrapper(sys.stdin.buffer, encoding='utf-8'))
+        streams.append(sys.stdin.buffer)
     else:
         for fname in input_files:
-            streams.append(TextIOWrapper(open(fname, 'rb'), encoding='utf-8'))
+            streams.append(open(fname, 'rb', buffering=INPUT_BUFFER_SIZE))
     
     try:
         if options.in_place and input_files:
             for fname in input_files:
                 process_in_place(Path(fname), combined_script, options)
         else:
-            for line in PySedCore_process(streams, combined_script, options):
-                sys.stdout.write(line)
-                sys.stdout.flush()
+            out = sys.stdout.buffer
+            chunks = PySedCore_process(streams, combined_script, options)
+            if options.unbuffered:
+                for chunk in chunks:
+                    out.write(chunk)
+                    out.flush()
+            else:
+                out.writelines(chunks)
+            out.flush()
         
         return 0
     except Exception as e:
@@ -413,7 +590,8 @@ def PySedCore_main(argv: List[str]) -> int:
         return 1
     finally:
         for stream in streams:
-            if hasattr(stream, 'close') and stream != sys.stdin:
+            if hasattr(stream, 'close') and stream is not sys.stdin.buffer:
                 stream.close()
 
-PySedCore_main(sys.argv)
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(PySedCore_main(sys.argv))
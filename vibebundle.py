@@ -2,11 +2,35 @@
 import argparse
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import subprocess
 import shlex
 import re
 import json
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Same retry policy as vibecl.py, which documents it.
+_RETRY_OPTIONS = dict(total=5, backoff_factor=1.0,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset({"POST"}),
+                      respect_retry_after_header=True,
+                      raise_on_status=False)
+try:
+    _RETRY = Retry(backoff_jitter=1.0, **_RETRY_OPTIONS)
+except TypeError:
+    _RETRY = Retry(**_RETRY_OPTIONS)
+
+# Shared session so repeated API calls reuse the pooled TLS connection.
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4,
+                                       max_retries=_RETRY))
+
 def read_files(files):
     """Read the contents of the files into a dictionary {filename: content}."""
     contents = {}
@@ -69,9 +93,10 @@ Here are the source files to work on:
             "messages": [{"role": "user", "content": prompt}],
             "temperature": 0.1,
         }
-        response = requests.post(url, headers=headers, json=data, timeout=240)
+        response = _SESSION.post(url, headers=headers, json=data, timeout=240, stream=True)
         response.raise_for_status()
-        resp_json = response.json()
+        body = b''.join(response.iter_content(65536))
+        resp_json = _json_loads(body)
 
         generated_content = resp_json["choices"][0]["message"]["content"].strip()
      
@@ -103,8 +128,8 @@ Here are the source files to work on:
         print(f"Error processing API response: {e}")
         # Optionally, save raw response for debugging
         try:
-            with open('debug_response.txt', 'w') as f:
-                f.write(response.text)
+            with open('debug_response.txt', 'wb') as f:
+                f.write(body)
             print("Raw response saved to debug_response.txt for inspection.")
         except NameError:
             pass  # No response object
@@ -9,26 +9,224 @@ import os
 import sys
 import argparse
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import subprocess
+import glob
+import io
+import re
+import json
+import functools
+import hashlib
+import tempfile
+import stat
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Tuple
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+    def _json_dumps(obj):
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+# Cache entries are zstd frames when zstandard is installed, plain JSON otherwise.
+try:
+    import zstandard
+    _CACHE_SUFFIX = ".json.zst"
+    _CACHE_ERRORS = (OSError, ValueError, KeyError, zstandard.ZstdError)
+    # Builds run threaded and a (de)compressor must not be used by two threads at once.
+    def _cache_encode(raw: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    def _cache_decode(raw: bytes) -> bytes:
+        return zstandard.ZstdDecompressor().decompress(raw)
+except ImportError:
+    _CACHE_SUFFIX = ".json"
+    _CACHE_ERRORS = (OSError, ValueError, KeyError)
+    def _cache_encode(raw: bytes) -> bytes:
+        return raw
+    _cache_decode = _cache_encode
+
+# Transient failures (rate limits, gateway errors) are retried with exponential
+# backoff, honouring Retry-After, so one flaky call does not abort the run.
+# Each tool is a standalone script with its own copy of this policy; change them together.
+_RETRY_OPTIONS = dict(total=5, backoff_factor=1.0,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset({"POST"}),
+                      respect_retry_after_header=True,
+                      raise_on_status=False)
+try:
+    # Jitter keeps parallel clients from retrying in lockstep
+    _RETRY = Retry(backoff_jitter=1.0, **_RETRY_OPTIONS)
+except TypeError:
+    # backoff_jitter arrived in urllib3 2.0
+    _RETRY = Retry(**_RETRY_OPTIONS)
+
+def _make_adapter(pool_maxsize: int) -> HTTPAdapter:
+    """
+    Builds the HTTPS adapter; pool_maxsize should cover the number of concurrent
+    requests so every in-flight call keeps its TLS connection alive for reuse.
+    """
+    return HTTPAdapter(
+        pool_connections=4, pool_maxsize=pool_maxsize,
+        max_retries=_RETRY)
+
+# Shared session: keep-alive reuses the TLS connection across API calls.
+_SESSION = requests.Session()
+_SESSION.mount("https://", _make_adapter(16))
+
+@functools.lru_cache(maxsize=256)
+def _read_cached(filepath: str, mtime_ns: int, size: int) -> str:
+    """
+    Reads and decodes a file; keyed on mtime and size so edits invalidate it.
+    """
+    with open(filepath, 'rb') as f:
+        return f.read().decode('utf-8')
+
 def read_file_content(filepath: str) -> Optional[str]:
     """
     Reads the content of a file as a string.
     Assumes text files; for binary, it may not work well.
+    Unchanged files are served from memory on repeat reads.
     """
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return f.read()
+        st = os.stat(filepath)
+        return _read_cached(filepath, st.st_mtime_ns, st.st_size)
     except (IOError, OSError) as e:
         print(f"Error reading file {filepath}: {e}")
         return None
+
+# Completions for deterministic requests are cached here, keyed by request hash.
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vibetools")
+
+def cache_key(data: dict) -> str:
+    """
+    Hashes the parts of a request body that determine its completion.
+    """
+    canonical = json.dumps([data["model"], data["messages"], data.get("temperature", 0),
+                            data.get("max_tokens")],
+                           sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def cache_lookup(key: str) -> Optional[str]:
+    """
+    Returns the cached completion for key, or None on a miss.
+    """
+    try:
+        with open(os.path.join(CACHE_DIR, key + _CACHE_SUFFIX), 'rb') as f:
+            return _json_loads(_cache_decode(f.read()))["content"]
+    except _CACHE_ERRORS:
+        return None
+
+def cache_store(key: str, content: str):
+    """
+    Atomically writes a completion to the cache; failures are ignored.
+    """
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_cache_encode(_json_dumps({"content": content})))
+        os.replace(tmp, os.path.join(CACHE_DIR, key + _CACHE_SUFFIX))
+    except OSError as e:
+        print(f"Warning: could not write response cache: {e}", file=sys.stderr)
+
+def read_streamed_content(response: requests.Response) -> str:
+    """
+    Collects the text deltas of a streamed (server-sent events) chat completion.
+    """
+    buf = io.StringIO()
+    for line in response.iter_lines():
+        if not line.startswith(b"data: "):
+            continue
+        payload = line[6:]
+        if payload == b"[DONE]":
+            break
+        if b'"content"' not in payload:
+            continue  # role, finish and usage frames carry no text
+        choices = _json_loads(payload).get("choices")
+        if not choices:
+            continue
+        buf.write(choices[0].get("delta", {}).get("content") or "")
+    return buf.getvalue()
+
+# Craft the prompt to ensure only code is returned
+_SYSTEM_PROMPT_HEAD = "You are an expert programmer.  The very best of the best."
+_SYSTEM_PROMPT_PYTHON = "You are generating Python 3.12 code only."
+_SYSTEM_PROMPT_RULES = (
+    "Never invent methods or attributes that do not exist in the official documentation."
+    "If you are unsure, write the safest, most boring, explicitly correct code."
+)
+_SYSTEM_PROMPT_TAIL = _SYSTEM_PROMPT_RULES + (
+    "Respond with ONLY the code that implements the requested program. "
+    "Do not include any explanations, comments, or markdown formatting. "
+    "Output pure code."
+)
+# Bulk builds ask for several files in one reply, so each needs a header and fence.
+_SYSTEM_PROMPT_BULK = _SYSTEM_PROMPT_RULES + (
+    " Respond with ONLY the code of each requested module, each in exactly this format "
+    "and with no other text:\n"
+    "File: <short>.py\n```python\n<code>\n```"
+)
+_FILE_BLOCK_RE = re.compile(r'File:\s*([^\n]+?)\s*```[^\n]*\n(.*?)```', re.DOTALL)
+
+@functools.lru_cache(maxsize=8)
+def _system_prompt(language: str) -> str:
+    """
+    Assembles the system prompt; it depends only on the target language.
+    """
+    if language.lower().startswith("python"):
+        return "\n\n".join((_SYSTEM_PROMPT_HEAD, _SYSTEM_PROMPT_PYTHON, _SYSTEM_PROMPT_TAIL))
+    return "\n\n".join((_SYSTEM_PROMPT_HEAD, _SYSTEM_PROMPT_TAIL))
+
+def _write_file_contents(prompt: io.StringIO, files: List[str], revise: bool = False):
+    """
+    Writes the contents of files to the prompt as "File: name" sections,
+    sending identical contents only once.
+    """
+    # Read concurrently so slow disks overlap; results keep the given order
+    with ThreadPoolExecutor(max_workers=min(16, len(files))) as ex:
+        contents = list(ex.map(read_file_content, files))
+    file_contents = []
+    seen = {}
+    for filepath, content in zip(files, contents):
+        if content is not None:
+            # Identical contents only need to be sent once
+            digest = hashlib.sha256(content.encode('utf-8')).digest()
+            if digest in seen:
+                print(f"Skipping {os.path.basename(filepath)}: same contents as {os.path.basename(seen[digest])}.", file=sys.stderr)
+                continue
+            seen[digest] = filepath
+            file_contents.append((os.path.basename(filepath), content))
+        else:
+            print(f"Skipping file {filepath} due to read error.")
+
+    if file_contents:
+        if revise:
+            prompt.write("Here are the file to be revised:\n")
+        else:
+            prompt.write("Here are the contents of relevant files for context:\n")
+        for i, (filename, content) in enumerate(file_contents):
+            if i:
+                prompt.write("\n")
+            prompt.write("File: ")
+            prompt.write(filename)
+            prompt.write("\n")
+            prompt.write(content)
+            prompt.write("\n")
+        prompt.write("\n\n")
+
 def generate_code(description: str,
                   revise: bool = False,
                   context: Optional[str] = None,
                   files: Optional[List[str]] = None,
                   complete: Optional[str] = None,
                   language: Optional[str] = "Python",
-                  model: str = "grok-4-latest") -> Optional[str]:
+                  model: str = "grok-4-latest",
+                  cache: bool = True) -> Optional[str]:
     """
     Generates code based on a natural language description using the Grok API,
     optionally including additional context and file contents.
@@ -38,101 +236,99 @@ def generate_code(description: str,
         context (Optional[str]): Additional textual context to provide to the model.
         files (Optional[List[str]]): List of file paths whose contents to include as context.
         model (str): The Grok model to use (default: "grok-4-latest").
+        cache (bool): Reuse a cached completion for an identical deterministic request.
  
     Returns:
         Optional[str]: The generated code as a string, or None if an error occurs.
     """
-    api_key = os.getenv("XAI_API_KEY")
-    if not api_key:
-        raise ValueError("XAI_API_KEY environment variable is not set.")
- 
-    url = "https://api.x.ai/v1/chat/completions"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
- 
-
-    # Craft the prompt to ensure only code is returned
-    system_prompt_parts = []
-    system_prompt_parts.append("You are an expert programmer.  The very best of the best.")
-
-    if language.lower().startswith("python"):
-        system_prompt_parts.append("You are generating Python 3.12 code only.")
-
-    system_prompt_parts.append(
-        "Never invent methods or attributes that do not exist in the official documentation."
-        "If you are unsure, write the safest, most boring, explicitly correct code."
-        "Respond with ONLY the code that implements the requested program. "
-        "Do not include any explanations, comments, or markdown formatting. "
-        "Output pure code."
-    )
-
-    system_prompt = "\n\n".join(system_prompt_parts)
+    system_prompt = _system_prompt(language)
  
-    # Build user prompt with context and files
-    user_prompt_parts = []
+    # Build user prompt with context and files in a single buffer;
+    # sections are separated by a blank line.
+    prompt = io.StringIO()
  
     if files:
-        file_contexts = []
-        for filepath in files:
-            content = read_file_content(filepath)
-            if content is not None:
-                filename = os.path.basename(filepath)
-                file_contexts.append(f"File: {filename}\n{content}\n")
-            else:
-                print(f"Skipping file {filepath} due to read error.")
-    
-        if file_contexts:
-            if revise:
-                user_prompt_parts.append("Here are the file to be revised:\n" + "\n".join(file_contexts))
-            else:
-                user_prompt_parts.append("Here are the contents of relevant files for context:\n" + "\n".join(file_contexts))
+        _write_file_contents(prompt, files, revise)
  
     if context:
-        user_prompt_parts.append(f"Additional context: {context}")
+        prompt.write("Additional context: ")
+        prompt.write(context)
+        prompt.write("\n\n")
  
     if revise:
-        user_prompt_parts.append(f"Revise the program (attached) in the following way {description}")
+        prompt.write("Revise the program (attached) in the following way ")
     else:
-        user_prompt_parts.append(f"Write a program in {language} that: {description}")
+        prompt.write(f"Write a program in {language} that: ")
+    prompt.write(description)
 
     if complete:
         content = read_file_content(complete)
         if content is not None:
-            user_prompt_parts.append("For a wider context of what the program is meant to do, here is the entire design file.  Note you are still being asked to only generate code for a single module, this wider context is only here so you can understand the big picture:\n" + "\n".join(content))
+            prompt.write("\n\nFor a wider context of what the program is meant to do, here is the entire design file.  Note you are still being asked to only generate code for a single module, this wider context is only here so you can understand the big picture:\n")
+            prompt.write(content)
+ 
+    generated_content = request_completion(system_prompt, prompt.getvalue(), model, cache)
+    if generated_content is None:
+        return None
+ 
+    # Strip markdown code fences if present: slice between the opening
+    # fence line and a closing line that is just ```
+    if generated_content.startswith('```'):
+        first_nl = generated_content.find('\n')
+        last_nl = generated_content.rfind('\n')
+        if first_nl != -1 and generated_content[last_nl + 1:].strip() == '```':
+            generated_content = generated_content[first_nl + 1:last_nl].strip()
+ 
+    # Basic check to ensure it's code (starts with python-like content)
+    if generated_content.startswith(("def ", "class ", "import ", "#", "")) or "print(" in generated_content:
+        return generated_content
+    else:
+        # Fallback: return as is, but log warning in production
+        return generated_content
+
+def request_completion(system_prompt: str,
+                       user_prompt: str,
+                       model: str,
+                       cache: bool = True) -> Optional[str]:
+    """
+    Sends one chat completion request and returns the streamed reply, stripped,
+    or None if the request fails.  Deterministic requests are answered from the
+    disk cache when possible.
+    """
+    api_key = os.getenv("XAI_API_KEY")
+    if not api_key:
+        raise ValueError("XAI_API_KEY environment variable is not set.")
+ 
+    url = "https://api.x.ai/v1/chat/completions"
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
  
-    user_prompt = "\n\n".join(user_prompt_parts)
-    
     data = {
         "model": model,
         "messages": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ],
-        "stream": False
+        # Near-deterministic sampling, so a cached completion stands in for a fresh one
+        "temperature": 0.1,
+        "stream": True
     }
  
+    body = _json_dumps(data)
+    cacheable = cache and data["temperature"] <= 0.1
+    key = cache_key(data) if cacheable else None
+ 
     try:
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status() # Raises an HTTPError for bad responses
-        result = response.json()
-        generated_content = result["choices"][0]["message"]["content"].strip()
-     
-        # Strip markdown code fences if present
-        lines = generated_content.splitlines()
-        if lines and lines[0].strip().startswith('```') and len(lines) > 1 and lines[-1].strip() == '```':
-            lines = lines[1:-1]
-            generated_content = '\n'.join(lines).strip()
-        else:
-            generated_content = generated_content.strip()
-     
-        # Basic check to ensure it's code (starts with python-like content)
-        if generated_content.startswith(("def ", "class ", "import ", "#", "")) or "print(" in generated_content:
-            return generated_content
-        else:
-            # Fallback: return as is, but log warning in production
-            return generated_content
+        generated_content = cache_lookup(key) if cacheable else None
+        if generated_content is None:
+            response = _SESSION.post(url, headers=headers, data=body, timeout=(5, 240), stream=True)
+            response.raise_for_status() # Raises an HTTPError for bad responses
+            generated_content = read_streamed_content(response).strip()
+            if cacheable and generated_content:
+                cache_store(key, generated_content)
+        return generated_content
     except requests.exceptions.RequestException as e:
         print(f"API request failed: {e}")
         return None
@@ -143,57 +339,327 @@ def generate_code(description: str,
         print(f"ValueError: {e}")
         return None
 
+def generate_modules(modules: List[dict],
+                     context: Optional[str] = None,
+                     files: Optional[List[str]] = None,
+                     complete: Optional[str] = None,
+                     model: str = "grok-4-latest",
+                     cache: bool = True) -> dict:
+    """
+    Generates several Python modules with a single request, so small modules
+    share the per-request overhead.  The shared dependency files and the design
+    file are sent once for the whole group.
+    Returns {short: code} for each module found in the reply; empty on error.
+    """
+    prompt = io.StringIO()
+ 
+    if files:
+        _write_file_contents(prompt, files)
+ 
+    if context:
+        prompt.write("Additional context: ")
+        prompt.write(context)
+        prompt.write("\n\n")
+ 
+    prompt.write(f"Write the following {len(modules)} modules in Python, each as its own file named after its Short name:\n")
+    for module in modules:
+        prompt.write(f"\nModule: {module.get('title', module['short'])}\n")
+        prompt.write(f"File: {module['short']}.py\n")
+        prompt.write(module['description'])
+        prompt.write("\n")
+
+    if complete:
+        content = read_file_content(complete)
+        if content is not None:
+            prompt.write("\n\nFor a wider context of what the program is meant to do, here is the entire design file.  Note you are only being asked to generate code for the modules listed above, this wider context is only here so you can understand the big picture:\n")
+            prompt.write(content)
+ 
+    system_prompt = "\n\n".join((_SYSTEM_PROMPT_HEAD, _SYSTEM_PROMPT_PYTHON, _SYSTEM_PROMPT_BULK))
+    generated_content = request_completion(system_prompt, prompt.getvalue(), model, cache)
+    if not generated_content:
+        return {}
+ 
+    wanted = {module['short'] for module in modules}
+    generated = {}
+    for name, code in _FILE_BLOCK_RE.findall(generated_content):
+        short = os.path.splitext(os.path.basename(name.strip().strip('`*')))[0]
+        if short in wanted:
+            generated[short] = code.strip()
+    return generated
+
+def _find_header(text: str, tag: str) -> Tuple[int, int]:
+    """
+    Locates the first line starting with tag.
+    Returns the (start, end) offsets of its value, or (-1, -1) if absent.
+    """
+    if text.startswith(tag):
+        start = len(tag)
+    else:
+        start = text.find('\n' + tag)
+        if start < 0:
+            return -1, -1
+        start += 1 + len(tag)
+    end = text.find('\n', start)
+    return start, end if end >= 0 else len(text)
+
 def parse_module_file(filename: str) -> dict:
     """
     Parses the module design file to extract title, short, uses, and description.
     """
     with open(filename, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+        text = f.read()
   
     module = {}
-    desc_lines = []
-    in_desc = False
-    uses = []
+    description = ''
+  
+    start, end = _find_header(text, 'Module: ')
+    if start >= 0:
+        module['title'] = text[start:end].strip()
+  
+    start, end = _find_header(text, 'Short: ')
+    if start >= 0:
+        module['short'] = text[start:end].strip()
+        desc_start = end + 1
+        description = text[desc_start:]
   
-    for line in lines:
-        line = line.rstrip('\n')
-        if line.startswith('Module: '):
-            module['title'] = line[8:].strip()
-        elif line.startswith('Short: '):
-            module['short'] = line[7:].strip()
-            in_desc = True
-        elif line.startswith('Uses: '):
-            uses_str = line[6:].strip()
-            if uses_str:
-                uses = [u.strip() for u in uses_str.split(',')]
-            module['uses'] = uses
-        elif in_desc:
-            desc_lines.append(line)
+    start, end = _find_header(text, 'Uses: ')
+    if start >= 0:
+        uses_str = text[start:end].strip()
+        module['uses'] = [u.strip() for u in uses_str.split(',')] if uses_str else []
+        # Cut the Uses line out of the description when it follows Short
+        line_start = start - len('Uses: ')
+        if 'short' in module and line_start >= desc_start:
+            description = text[desc_start:line_start] + text[end + 1:]
   
-    module['description'] = '\n'.join(desc_lines).strip()
+    module['description'] = description.strip()
     return module
 
+# Read once at import, while single-threaded: os.umask can only be queried by setting it.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _file_matches(filename: str, size: int, digest: bytes) -> bool:
+    """
+    Compares a file on disk against a size and sha256 digest, hashing 64 KiB at a time
+    and skipping the read entirely when the sizes differ.
+    """
+    if os.path.getsize(filename) != size:
+        return False
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        while chunk := f.read(65536):
+            h.update(chunk)
+    return h.digest() == digest
+
 def write_if_changed(filename: str, content: str) -> bool:
     """
     Writes content to filename only if it differs from existing content or file doesn't exist.
+    The write goes through a temporary file and os.replace, so readers never see a partial file.
     Returns True if written.
     """
-    if os.path.exists(filename):
-        with open(filename, 'r', encoding='utf-8') as f:
-            existing = f.read().strip()
-        if existing == content:
+    data = content.encode('utf-8')
+    try:
+        mode = stat.S_IMODE(os.stat(filename).st_mode)
+        if _file_matches(filename, len(data), hashlib.sha256(data).digest()):
             return False
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
   
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(content)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename) or '.')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.chmod(tmp, mode)
+    os.replace(tmp, filename)
     return True
 
 def touch_file(filename: str):
     """
-    Touches the file to update its timestamp.
+    Touches the file to update its timestamp, creating it if missing.
+    """
+    pathlib.Path(filename).touch()
+
+def list_present_files() -> set:
+    """
+    Returns the names in the current directory, where modules are built, from a single scandir.
+    """
+    with os.scandir('.') as entries:
+        return {entry.name for entry in entries}
+
+def build_module(module_file: str, args: argparse.Namespace) -> bool:
+    """
+    Builds one module design file into <short>.py and touches <short>.built.
+    Returns True on success.
+    """
+    module = parse_module_file(module_file)
+  
+    if 'short' not in module:
+        print(f"Error: 'Short:' not found in module file {module_file}.", file=sys.stderr)
+        return False
+  
+    if not module['description']:
+        print(f"Error: No description found in module file {module_file}.", file=sys.stderr)
+        return False
+  
+    short = module['short']
+    uses = module.get('uses', [])
+    dep_files = [f"{u}.py" for u in uses]
+  
+    # Check if all dep files exist; one directory scan instead of a stat per file
+    present = list_present_files()
+    missing_deps = [f for f in dep_files if f not in present]
+    if missing_deps:
+        print(f"Error: Missing dependency files: {missing_deps}", file=sys.stderr)
+        return False
+  
+    # Prepare files and context for generation
+    py_filename = f"{short}.py"
+    existing_files = dep_files[:]
+    context_msg = args.context  # Preserve any provided context
+    if py_filename in present:
+        existing_files.append(py_filename)
+        print("Earlier version exists on disk, requesting a revision to instead of rewrite.")
+        revision_context = "Here is an earlier version of the file for you to start from and revise."
+        if context_msg:
+            context_msg += " " + revision_context
+        else:
+            context_msg = revision_context
+  
+    # In build mode, override language to Python, and use args.model
+    generated_code = generate_code(
+        description=module['description'],
+        revise=args.revise,
+        context=context_msg,
+        files=existing_files,
+        complete=args.complete,
+        language="Python",
+        model=args.model,
+        cache=args.cache
+    )
+  
+    if generated_code is None:
+        print(f"Failed to generate code for {module_file}.", file=sys.stderr)
+        return False
+  
+    finish_module(short, generated_code)
+    return True
+
+def finish_module(short: str, generated_code: str):
+    """
+    Writes generated code to <short>.py if it changed and touches <short>.built.
     """
-    with open(filename, 'a') as f:
-        pass
+    py_filename = f"{short}.py"
+    built_filename = f"{short}.built"
+  
+    changed = write_if_changed(py_filename, generated_code)
+  
+    # Always touch the built file to mark the build as complete
+    touch_file(built_filename)
+  
+    if changed:
+        print(f"Generated/updated {py_filename}")
+    else:
+        print(f"No changes to {py_filename}")
+  
+    print(f"Build complete: {built_filename}")
+
+def build_bulk(module_files: List[str], args: argparse.Namespace) -> bool:
+    """
+    Builds a group of new modules, whose dependencies are all on disk, with
+    one request.  Modules missing from the reply are built one at a time.
+    Returns True if every module built.
+    """
+    if len(module_files) == 1:
+        return build_module(module_files[0], args)
+  
+    modules = [parse_module_file(m) for m in module_files]
+    # Dependencies shared by several modules are sent once
+    dep_files = sorted({f"{u}.py" for module in modules for u in module.get('uses', [])})
+    print(f"Requesting {', '.join(m['short'] for m in modules)} together.")
+  
+    generated = generate_modules(
+        modules,
+        context=args.context,
+        files=dep_files,
+        complete=args.complete,
+        model=args.model,
+        cache=args.cache
+    )
+  
+    ok = True
+    for module_file, module in zip(module_files, modules):
+        code = generated.get(module['short'])
+        if code is not None:
+            finish_module(module['short'], code)
+        else:
+            print(f"{module['short']} missing from the combined reply, building it alone.")
+            ok = build_module(module_file, args) and ok
+    return ok
+
+def is_up_to_date(module_file: str, module: dict) -> bool:
+    """
+    Mirrors make's check for <short>.built: it must exist and be no older than
+    the module file and the .built stamps of the modules it uses.
+    """
+    try:
+        built = os.stat(f"{module['short']}.built").st_mtime_ns
+        prereqs = [module_file] + [f"{u}.built" for u in module.get('uses', [])]
+        return all(os.stat(p).st_mtime_ns <= built for p in prereqs)
+    except OSError:
+        return False
+
+def find_module_files(description: str) -> List[str]:
+    """
+    Expands a directory or glob pattern into the module design files it names.
+    Returns an empty list if the description is neither.
+    """
+    if os.path.isdir(description):
+        return sorted(glob.glob(os.path.join(description, '*.txt')))
+    if any(c in description for c in '*?['):
+        return sorted(f for f in glob.glob(description) if f.endswith('.txt'))
+    return []
+
+def build_modules(module_files: List[str], args: argparse.Namespace) -> bool:
+    """
+    Builds many module design files, overlapping the API calls of modules
+    whose dependencies are already on disk. Modules that use another module
+    in the batch wait for the wave that produces it.
+    Returns True if every module built.
+    """
+    pending = {}
+    modules = {}
+    for module_file in module_files:
+        module = parse_module_file(module_file)
+        if args.bulk > 1 and 'short' in module and is_up_to_date(module_file, module):
+            print(f"{module['short']}.built is up to date.")
+            continue
+        modules[module_file] = module
+        pending[module_file] = [f"{u}.py" for u in module.get('uses', [])]
+  
+    ok = True
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        while pending:
+            present = list_present_files()
+            ready = [m for m, deps in pending.items()
+                     if all(d in present for d in deps)]
+            if not ready:
+                # Nothing can make progress; let each report its missing deps.
+                ready = list(pending)
+            groups = [[m] for m in ready]
+            if args.bulk > 1:
+                # Modules with no earlier version are written from scratch and can
+                # share a request; revisions and broken files still go one by one.
+                fresh = [m for m in ready
+                         if modules[m].get('short') and modules[m]['description']
+                         and f"{modules[m]['short']}.py" not in present
+                         and all(d in present for d in pending[m])]
+                groups = [[m] for m in ready if m not in fresh]
+                groups += [fresh[i:i + args.bulk] for i in range(0, len(fresh), args.bulk)]
+            results = pool.map(lambda group: build_bulk(group, args), groups)
+            for group, built in zip(groups, results):
+                ok = ok and built
+                for module_file in group:
+                    del pending[module_file]
+    return ok
 
 def main():
     parser = argparse.ArgumentParser(
@@ -227,73 +693,33 @@ def main():
         "--revise", type=bool, default=False,
         help="Revise file, do not start from scratch"
     )
+    parser.add_argument(
+        "--concurrency", type=int, default=4,
+        help="Maximum concurrent API requests when building a directory or glob of module files (default: 4)."
+    )
+    parser.add_argument(
+        "--bulk", type=int, default=1,
+        help="When building a directory or glob, request up to this many new modules per API call and skip modules whose .built is up to date (default: 1, one module per call)."
+    )
+    parser.add_argument(
+        "--cache", action=argparse.BooleanOptionalAction, default=True,
+        help="Reuse cached responses for identical requests from ~/.cache/vibetools (default: on)."
+    )
  
     args = parser.parse_args()
  
-    # Check if description is a module file
-    if os.path.exists(args.description) and args.description.endswith('.txt'):
-        module_file = args.description
-        module = parse_module_file(module_file)
-      
-        if 'short' not in module:
-            print("Error: 'Short:' not found in module file.", file=sys.stderr)
-            sys.exit(1)
-      
-        if not module['description']:
-            print("Error: No description found in module file.", file=sys.stderr)
-            sys.exit(1)
-      
-        short = module['short']
-        uses = module.get('uses', [])
-        dep_files = [f"{u}.py" for u in uses]
-      
-        # Check if all dep files exist
-        missing_deps = [f for f in dep_files if not os.path.exists(f)]
-        if missing_deps:
-            print(f"Error: Missing dependency files: {missing_deps}", file=sys.stderr)
+    # Check if description names a batch of module files
+    module_files = find_module_files(args.description)
+    if module_files:
+        if args.concurrency > 16:
+            # Connections beyond the pool size would be closed after each call
+            _SESSION.mount("https://", _make_adapter(args.concurrency))
+        if not build_modules(module_files, args):
             sys.exit(1)
-      
-        # Prepare files and context for generation
-        py_filename = f"{short}.py"
-        existing_files = dep_files[:]
-        context_msg = args.context  # Preserve any provided context
-        if os.path.exists(py_filename):
-            existing_files.append(py_filename)
-            print("Earlier version exists on disk, requesting a revision to instead of rewrite.")
-            revision_context = "Here is an earlier version of the file for you to start from and revise."
-            if context_msg:
-                context_msg += " " + revision_context
-            else:
-                context_msg = revision_context
-      
-        # In build mode, override language to Python, and use args.model
-        generated_code = generate_code(
-            description=module['description'],
-            revise=args.revise,
-            context=context_msg,
-            files=existing_files,
-            complete=args.complete,
-            language="Python",
-            model=args.model
-        )
-      
-        if generated_code is None:
-            print("Failed to generate code.", file=sys.stderr)
+    # Check if description is a module file
+    elif os.path.exists(args.description) and args.description.endswith('.txt'):
+        if not build_module(args.description, args):
             sys.exit(1)
-      
-        built_filename = f"{short}.built"
-      
-        changed = write_if_changed(py_filename, generated_code)
-      
-        # Always touch the built file to mark the build as complete
-        touch_file(built_filename)
-      
-        if changed:
-            print(f"Generated/updated {py_filename}")
-        else:
-            print(f"No changes to {py_filename}")
-      
-        print(f"Build complete: {built_filename}")
     else:
         # Regular mode
         code = generate_code(
@@ -303,7 +729,8 @@ def main():
             files=args.files,
             complete=args.complete,
             language=args.language,
-            model=args.model
+            model=args.model,
+            cache=args.cache
         )
  
         if code:
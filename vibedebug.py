@@ -1,16 +1,96 @@
 #!/usr/bin/python3
 import argparse
 import os
+import sys
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import subprocess
 import shlex
 import re
 import json
+import io
+import functools
+import hashlib
+import tempfile
+import stat
+import difflib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+    def _json_dumps(obj):
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+# Cache entries are zstd frames when zstandard is installed, plain JSON otherwise.
+try:
+    import zstandard
+    _CACHE_SUFFIX = ".json.zst"
+    _CACHE_ERRORS = (OSError, ValueError, KeyError, zstandard.ZstdError)
+    _cache_encode = zstandard.ZstdCompressor(level=3).compress
+    _cache_decode = zstandard.ZstdDecompressor().decompress
+except ImportError:
+    _CACHE_SUFFIX = ".json"
+    _CACHE_ERRORS = (OSError, ValueError, KeyError)
+    def _cache_encode(raw):
+        return raw
+    _cache_decode = _cache_encode
+
+# Same retry policy as vibecl.py, which documents it.
+_RETRY_OPTIONS = dict(total=5, backoff_factor=1.0,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset({"POST"}),
+                      respect_retry_after_header=True,
+                      raise_on_status=False)
+try:
+    _RETRY = Retry(backoff_jitter=1.0, **_RETRY_OPTIONS)
+except TypeError:
+    _RETRY = Retry(**_RETRY_OPTIONS)
+
+# Shared session: keep-alive reuses the TLS connection across API calls.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4, pool_maxsize=16,
+    max_retries=_RETRY))
+
+# Only the last OUTPUT_LIMIT bytes of a program's output are kept, read OUTPUT_CHUNK_SIZE at a time.
+OUTPUT_LIMIT = 64 * 1024
+OUTPUT_CHUNK_SIZE = 4096
+
+def _feed_stdin(pipe, data):
+    """Write data to the child's stdin and close it; the child may exit without reading."""
+    try:
+        pipe.write(data)
+        pipe.close()
+    except (BrokenPipeError, OSError):
+        pass
+
+def _drain_output(pipe, ring, dropped, lock):
+    """Read the child's output into ring, dropping the oldest chunks beyond OUTPUT_LIMIT bytes.
+    ring and dropped are only changed under lock; the pipe is closed at EOF."""
+    size = 0
+    with pipe:
+        while chunk := pipe.read1(OUTPUT_CHUNK_SIZE):
+            with lock:
+                ring.append(chunk)
+                size += len(chunk)
+                while size > OUTPUT_LIMIT:
+                    old = ring.popleft()
+                    size -= len(old)
+                    dropped[0] += len(old)
 
 def execute_program(command, stdin_input, timeout=30):
     """
     Executes a program with the given command and piped stdin_input.
-    Captures stdout and stderr, combines them.
+    Captures stdout and stderr interleaved through one pipe, as bytes,
+    keeping only the last OUTPUT_LIMIT bytes so a
+    runaway program cannot exhaust memory or flood the prompt.
    
     Returns (True, combined_output) if the program exits normally (returncode 0)
     or is terminated after timeout seconds.
@@ -26,46 +106,201 @@ def execute_program(command, stdin_input, timeout=30):
             command,
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-            bufsize=0 # Unbuffered
+            stderr=subprocess.STDOUT
         )
-        stdout, stderr = proc.communicate(input=stdin_input, timeout=timeout)
-       
-        # Check returncode after normal completion
-        if proc.returncode == 0:
-            return True, stdout + stderr
-        else:
-            return False, stdout + stderr
-           
-    except subprocess.TimeoutExpired:
-        # Process was killed due to timeout; partial output is available
-        # In Python 3.3+, communicate() with timeout provides partial stdout/stderr
-        # and proc.returncode is set (e.g., to -SIGTERM)
-        return True, stdout + stderr
     except Exception as e:
         # Handle unexpected errors (e.g., command not found)
         return False, f"Error executing command: {str(e)}"
+    try:
+        ring = deque()
+        dropped = [0]
+        lock = threading.Lock()
+        writer = threading.Thread(target=_feed_stdin,
+                                  args=(proc.stdin, stdin_input.encode('utf-8')), daemon=True)
+        reader = threading.Thread(target=_drain_output,
+                                  args=(proc.stdout, ring, dropped, lock), daemon=True)
+        writer.start()
+        reader.start()
+        try:
+            proc.wait(timeout=timeout)
+            # Check returncode after normal completion
+            success = proc.returncode == 0
+        except subprocess.TimeoutExpired:
+            # Kill the program; the output so far counts as a successful run
+            proc.kill()
+            proc.wait()
+            success = True
+        # A grandchild can hold the pipe open after the program exits; the
+        # reader then keeps running and owns the pipe, so only copy what it has.
+        reader.join(timeout=5)
+        with lock:
+            chunks = list(ring)
+            omitted = dropped[0]
+        output = b''.join(chunks).decode('utf-8', errors='replace')
+        if omitted:
+            output = f"[... {omitted} bytes of earlier output omitted ...]\n" + output
+        return success, output
+    except Exception as e:
+        # Handle unexpected errors (e.g., command not found)
+        return False, f"Error executing command: {str(e)}"
+
+# One fixed file in the response: File: name, then a fenced block.
+_FIXED_FILE_RE = re.compile(r'File:\s*([^\n]+?)\s*```\s*(.*?)```', re.DOTALL)
+
+def iter_streamed_content(response):
+    """Yield the text deltas of a streamed (server-sent events) chat completion."""
+    for line in response.iter_lines():
+        if not line.startswith(b"data: "):
+            continue
+        payload = line[6:]
+        if payload == b"[DONE]":
+            break
+        if b'"content"' not in payload:
+            continue  # role, finish and usage frames carry no text
+        choices = _json_loads(payload).get("choices")
+        if not choices:
+            continue
+        text = choices[0].get("delta", {}).get("content")
+        if text:
+            yield text
+
+def read_streamed_content(response):
+    """Collect the text deltas of a streamed (server-sent events) chat completion."""
+    buf = io.StringIO()
+    for text in iter_streamed_content(response):
+        buf.write(text)
+    return buf.getvalue()
+
+# Completions for deterministic requests are cached here, keyed by request hash.
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vibetools")
+
+def cache_key(data):
+    """Hash the parts of a request body that determine its completion."""
+    canonical = json.dumps([data["model"], data["messages"], data.get("temperature", 0),
+                            data.get("max_tokens")],
+                           sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def cache_lookup(key):
+    """Return the cached completion for key, or None on a miss."""
+    try:
+        with open(os.path.join(CACHE_DIR, key + _CACHE_SUFFIX), 'rb') as f:
+            return _json_loads(_cache_decode(f.read()))["content"]
+    except _CACHE_ERRORS:
+        return None
+
+def cache_store(key, content):
+    """Atomically write a completion to the cache; failures are ignored."""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_cache_encode(_json_dumps({"content": content})))
+        os.replace(tmp, os.path.join(CACHE_DIR, key + _CACHE_SUFFIX))
+    except OSError as e:
+        print(f"Warning: could not write response cache: {e}", file=sys.stderr)
+
+@functools.lru_cache(maxsize=256)
+def _read_cached(path, mtime_ns, size):
+    """Read and decode a file; keyed on mtime and size so edits invalidate it."""
+    with open(path, 'rb') as file:
+        return file.read().decode('utf-8')
+
+def _read_one(path):
+    """Read one file through the cache; None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return _read_cached(path, st.st_mtime_ns, st.st_size)
 
 def read_files(files):
-    """Read the contents of the files into a dictionary {filename: content}."""
+    """Read the contents of the files into a dictionary {filename: content}.
+    Files are read concurrently; those untouched since the last iteration
+    are served from memory."""
+    if not files:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(16, len(files))) as ex:
+        results = list(ex.map(_read_one, files))
     contents = {}
-    for f in files:
-        if os.path.exists(f):
-            with open(f, 'r', encoding='utf-8') as file:
-                contents[f] = file.read()
-        else:
+    for f, content in zip(files, results):
+        if content is None:
             print(f"Warning: File {f} does not exist.")
-            contents[f] = ""  # Empty if missing
+            content = ""  # Empty if missing
+        contents[f] = content
     return contents
 
 def format_files_for_prompt(files_dict):
     """Format files as code blocks for the prompt."""
-    formatted = ""
+    parts = []
     for filename, content in files_dict.items():
         print(f"File: {filename}")
-        formatted += f"File: {filename}\n```\n{content}\n```\n\n"
-    return formatted
+        parts.append(f"File: {filename}\n```\n{content}\n```\n\n")
+    return "".join(parts)
+
+def build_initial_prompt(args, prompt_part, files_dict, input_files_dict):
+    """Build the first prompt, carrying every source and input file in full."""
+    files_formatted = format_files_for_prompt(files_dict)
+    input_files_formatted = format_files_for_prompt(input_files_dict)
+    return f"""You are an expert code debugger. Here are the source files to debug:
+
+{files_formatted}
+
+The command to run the program is: {args.command}
+
+The input piped to stdin is: {args.input}
+{prompt_part}
+
+Here are the input files the program reads (if any, this may be blank):
+{input_files_formatted}
+
+Your task: Debug and fix the code in the provided files so that it executes successfully (return code 0) with the given command and input. Make minimal changes. Preserve the file structure and only modify the necessary parts.
+
+Respond ONLY with the fixed files, each in the exact format below (no other text or explanations):
+
+File: filename.ext
+```
+fixed content here
+```
+
+Repeat for each file, even if unchanged. Do not add extra lines or markdown outside these blocks."""
+
+def format_file_updates(files_dict, known_files):
+    """Format only the files that differ from the versions the model already has.
+    Returns (code blocks for changed files, unified diff of those against
+    their known versions, names of unchanged files)."""
+    parts = []
+    diffs = []
+    unchanged = []
+    for filename, content in files_dict.items():
+        known = known_files.get(filename)
+        if known == content:
+            unchanged.append(filename)
+            continue
+        print(f"File: {filename} (changed)")
+        parts.append(f"File: {filename}\n```\n{content}\n```\n\n")
+        if known is not None:
+            diffs.extend(difflib.unified_diff(known.splitlines(keepends=True),
+                                              content.splitlines(keepends=True),
+                                              fromfile=f"a/{filename}", tofile=f"b/{filename}"))
+    return "".join(parts), "".join(diffs), unchanged
+
+def build_followup_prompt(prompt_part, files_dict, input_files_dict, known_files):
+    """Build a later prompt in the same conversation: the new failure plus only
+    the files that changed since the model last saw them."""
+    parts = [f"Your fix did not work. {prompt_part}\n\n"]
+    changed, diff, unchanged = format_file_updates({**files_dict, **input_files_dict}, known_files)
+    if changed:
+        parts.append(f"These files differ from the versions you last saw:\n\n{changed}")
+    if diff:
+        if not diff.endswith("\n"):
+            diff += "\n"
+        parts.append(f"DIFF against those versions:\n```diff\n{diff}```\n\n")
+    if unchanged:
+        parts.append(f"Unchanged since your last reply: {', '.join(unchanged)}\n\n")
+    parts.append("Debug and fix the source files again. Respond ONLY with the fixed files "
+                 "in the same format as before, repeating each file even if unchanged.")
+    return "".join(parts)
 
 def parse_fixed_files(content):
     """Parse the API response to extract fixed file contents.
@@ -74,19 +309,60 @@ def parse_fixed_files(content):
     """
     files = {}
     # Find all blocks
-    pattern = r'File:\s*([^\n]+?)\s*```\s*(.*?)```'
-    matches = re.findall(pattern, content, re.DOTALL | re.MULTILINE)
-    for filename, fixed_content in matches:
+    for filename, fixed_content in _FIXED_FILE_RE.findall(content):
         filename = filename.strip()
         fixed_content = fixed_content.strip()
         files[filename] = fixed_content
     return files
 
+def stream_fixed_files(chunks, on_file):
+    """Parse fixed files out of streamed response text as it arrives.
+    Calls on_file(filename, fixed_content) as soon as each closing fence is
+    seen, so files are written while the rest is still being generated.
+    Returns the full response text.
+    """
+    text = io.StringIO()
+    buf = ""
+    for chunk in chunks:
+        text.write(chunk)
+        buf += chunk
+        # A block can only complete on a chunk carrying part of its fence.
+        if '`' not in chunk:
+            continue
+        pos = 0
+        while True:
+            match = _FIXED_FILE_RE.search(buf, pos)
+            if not match:
+                break
+            on_file(match.group(1).strip(), match.group(2).strip())
+            pos = match.end()
+        if pos:
+            buf = buf[pos:]
+    return text.getvalue()
+
+def _atomic_write(item):
+    """Write one file via filename.tmp and os.replace, keeping the old file's mode."""
+    filename, content = item
+    tmp = filename + '.tmp'
+    with open(tmp, 'w', encoding='utf-8', buffering=1 << 20) as file:
+        file.write(content)
+    try:
+        os.chmod(tmp, stat.S_IMODE(os.stat(filename).st_mode))
+    except FileNotFoundError:
+        pass
+    os.replace(tmp, filename)
+    return filename
+
 def write_fixed_files(files_dict):
-    """Write the fixed contents back to files, overwriting."""
-    for filename, content in files_dict.items():
-        with open(filename, 'w', encoding='utf-8') as file:
-            file.write(content)
+    """Write the fixed contents back to files, overwriting.
+    Each file is replaced atomically, so a crash never leaves one truncated;
+    several files are written concurrently."""
+    if len(files_dict) > 1:
+        with ThreadPoolExecutor(max_workers=min(16, len(files_dict))) as ex:
+            written = list(ex.map(_atomic_write, files_dict.items()))
+    else:
+        written = [_atomic_write(item) for item in files_dict.items()]
+    for filename in written:
         print(f"Updated {filename}")
 
 def main():
@@ -98,6 +374,7 @@ def main():
     parser.add_argument('--max_iterations', type=int, default=5, help="Maximum number of debugging iterations")
     parser.add_argument('--model', type=str, default="grok-4-1-fast-non-reasoning", help="Model to use for API calls")
     parser.add_argument('--issue', type=str, default=None, help="Describe the problem and pass that to grok, don't execute")
+    parser.add_argument('--cache', action=argparse.BooleanOptionalAction, default=True, help="Reuse cached responses for identical requests from ~/.cache/vibetools")
     args = parser.parse_args()
 
     # Parse command string into list
@@ -107,14 +384,33 @@ def main():
     if not api_key:
         print("Error: XAI_API_KEY environment variable not set.")
         return
+    _SESSION.headers.update({
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    })
+
+    # Only the previous exchange is carried forward, not the whole conversation,
+    # with the files whose full text is in it; later iterations send the rest in
+    # full, so each request holds about one copy of each file.
+    messages = []
+    known_files = {}
+
+    # The program is re-run as soon as a streamed fix is complete; the result
+    # stands in for the next iteration's execution.
+    speculator = ThreadPoolExecutor(max_workers=1)
+    spec_result = None
 
     success = False
     for iteration in range(args.max_iterations):
         print(f"\n--- Iteration {iteration + 1} ---")
         if args.issue:
-            success_flag, output = execute_program(command_list, args.input)
-            success_flag = False
-            output = ""
+            # The problem is described, not reproduced: don't run the program
+            success_flag, output = False, ""
+        elif spec_result is not None:
+            success_flag, output = spec_result
+            spec_result = None
+            print(f"Execution {'succeeded' if success_flag else 'failed'} (run while the response streamed)")
+            print("Output:", output if output else "No output")
         else:
             success_flag, output = execute_program(command_list, args.input)
             print(f"Execution {'succeeded' if success_flag else 'failed'}")
@@ -127,66 +423,87 @@ def main():
         else:
             # Read current files
             files_dict = read_files(args.files)
-            
-            # Prompt for Grok
-            files_formatted = format_files_for_prompt(files_dict)
-
-            if args.input_files:
-                input_files_dict = read_files(args.input_files)
-                input_files_formatted = format_files_for_prompt(input_files_dict)
+            input_files_dict = read_files(args.input_files)
 
             if args.issue:
                 prompt_part = f"The program is failing in the following way: {args.issue} and for reference here is (stdout + stderr) of execution: {output}"
             else:
                 prompt_part = f"The program failed with this output (stdout + stderr): {output}"
-    
-            prompt = f"""You are an expert code debugger. Here are the source files to debug:
-
-{files_formatted}
 
-The command to run the program is: {args.command}
-
-The input piped to stdin is: {args.input}
-{prompt_part}
-
-Here are the input files the program reads (if any, this may be blank):
-{input_files_formatted}
-
-Your task: Debug and fix the code in the provided files so that it executes successfully (return code 0) with the given command and input. Make minimal changes. Preserve the file structure and only modify the necessary parts.
-
-Respond ONLY with the fixed files, each in the exact format below (no other text or explanations):
-
-File: filename.ext
-```
-fixed content here
-```
-
-Repeat for each file, even if unchanged. Do not add extra lines or markdown outside these blocks."""
+            # Prompt for Grok
+            if messages:
+                prompt = build_followup_prompt(prompt_part, files_dict, input_files_dict, known_files)
+            else:
+                prompt = build_initial_prompt(args, prompt_part, files_dict, input_files_dict)
 
+            content = ""
             try:
                 url = "https://api.x.ai/v1/chat/completions"
-                headers = {
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                }
                 data = {
                     "model": args.model,
-                    "messages": [{"role": "user", "content": prompt}],
+                    "messages": messages + [{"role": "user", "content": prompt}],
                     "temperature": 0.1,
+                    "stream": True,
                 }
-                print(f"Sending request with model: {args.model}")  # Debug info
-                response = requests.post(url, headers=headers, json=data, timeout=240)
-                response.raise_for_status()
-                resp_json = response.json()
-                content = resp_json["choices"][0]["message"]["content"]
+                body = _json_dumps(data)
+                cacheable = args.cache and data["temperature"] <= 0.1
+                key = cache_key(data) if cacheable else None
+                cached = cache_lookup(key) if cacheable else None
+                if cached is not None:
+                    print("Using cached response")
+                    content = cached
+                    # Parse fixed files and write back
+                    fixed_files = parse_fixed_files(content)
+                    write_fixed_files(fixed_files)
+                else:
+                    print(f"Sending request with model: {args.model}")  # Debug info
+                    response = _SESSION.post(url, data=body, timeout=(5, 240), stream=True)
+                    response.raise_for_status()
+                    # Write each fixed file back as soon as it has streamed in
+                    fixed_files = {}
+                    speculation = {"future": None, "stale": False, "passed": False}
+                    def write_one(filename, fixed_content):
+                        if speculation["future"] is not None:
+                            # Files changed under the speculative run; its result no longer applies
+                            speculation["stale"] = True
+                        fixed_files[filename] = fixed_content
+                        write_fixed_files({filename: fixed_content})
+                        # Once every source file has arrived, run the program while the rest streams in
+                        if (not args.issue and speculation["future"] is None
+                                and all(f in fixed_files for f in args.files)):
+                            speculation["future"] = speculator.submit(execute_program, command_list, args.input)
+                    def until_speculation_passes(chunks):
+                        for chunk in chunks:
+                            yield chunk
+                            future = speculation["future"]
+                            if (future is not None and not speculation["stale"]
+                                    and future.done() and future.result()[0]):
+                                # The fix already works: stop paying for the rest of the generation
+                                print("Program succeeded on the streamed fix; stopping the response early.")
+                                speculation["passed"] = True
+                                response.close()
+                                return
+                    try:
+                        content = stream_fixed_files(until_speculation_passes(iter_streamed_content(response)), write_one)
+                    finally:
+                        # Never let a speculative run overlap the next execution, even a stale one
+                        spec = speculation["future"].result() if speculation["future"] is not None else None
+                    if spec is not None and not speculation["stale"]:
+                        spec_result = spec
+                    if cacheable and content and not speculation["passed"]:
+                        cache_store(key, content)
                 print(f"API response length: {len(content)} characters")
-                # Parse fixed files
-                fixed_files = parse_fixed_files(content)
                 print(f"Parsed {len(fixed_files)} fixed files")
                 if not fixed_files:
                     raise ValueError("No fixed files parsed from response")
-                # Write back
-                write_fixed_files(fixed_files)
+                # Keep the exchange so the next prompt can refer back to it
+                messages = [{"role": "user", "content": prompt},
+                            {"role": "assistant", "content": content}]
+                # Files only named as unchanged in this prompt were in full in the exchange just dropped
+                known_files = {filename: file_content
+                               for filename, file_content in {**files_dict, **input_files_dict}.items()
+                               if known_files.get(filename) != file_content}
+                known_files.update(fixed_files)
                 if args.issue:
                     break
                 print("Files updated by Grok. Retrying...")
@@ -209,19 +526,18 @@ Repeat for each file, even if unchanged. Do not add extra lines or markdown outs
                 break
             except (json.JSONDecodeError, KeyError, ValueError) as e:
                 print(f"Error processing API response: {{e}}")
-                # Optionally, save raw response for debugging
-                try:
+                # Optionally, save the streamed response text for debugging
+                if content:
                     with open('debug_response.txt', 'w') as f:
-                        f.write(response.text)
+                        f.write(content)
                     print("Raw response saved to debug_response.txt for inspection.")
-                except NameError:
-                    pass  # No response object
                 print("Aborting debugging.")
                 break
             except Exception as e:
                 print(f"Unexpected error: {{e}}")
                 print("Aborting debugging.")
                 break
+    speculator.shutdown()
     if not success:
         print("\nMax iterations reached or error occurred. Program still failing.")
 
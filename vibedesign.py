@@ -7,26 +7,127 @@ import os
 import sys
 import argparse
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import subprocess
+import json
+import io
+import mmap
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import tempfile
 from typing import Optional, List, Tuple
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+    def _json_dumps(obj):
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+# Same retry policy as vibecl.py, which documents it.
+_RETRY_OPTIONS = dict(total=5, backoff_factor=1.0,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset({"POST"}),
+                      respect_retry_after_header=True,
+                      raise_on_status=False)
+try:
+    _RETRY = Retry(backoff_jitter=1.0, **_RETRY_OPTIONS)
+except TypeError:
+    _RETRY = Retry(**_RETRY_OPTIONS)
+
+# Shared session: keep-alive reuses the TLS connection across API calls.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4, pool_maxsize=4,
+    max_retries=_RETRY))
+
+# Files at least this large are decoded straight from a memory map
+MMAP_THRESHOLD = 1024 * 1024
+
 def read_file_content(filepath: str) -> Optional[str]:
     """
     Reads the content of a file as a string.
     Assumes text files; for binary, it may not work well.
+    Large files are memory-mapped and decoded in place, so the raw bytes are
+    never copied onto the heap alongside the decoded text.
     """
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return f.read()
+        with open(filepath, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+                text = f.read().decode('utf-8')
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    text = str(mm, 'utf-8')
+        # Match text mode's universal newlines
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
     except (IOError, OSError) as e:
         print(f"Error reading file {filepath}: {e}")
         return None
 
+# Completions for deterministic requests are cached here, keyed by request hash.
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vibetools")
+
+def cache_key(data: dict) -> str:
+    """
+    Hashes the parts of a request body that determine its completion.
+    """
+    canonical = json.dumps([data["model"], data["messages"], data.get("temperature", 0),
+                            data.get("max_tokens")],
+                           sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def cache_lookup(key: str) -> Optional[str]:
+    """
+    Returns the cached completion for key, or None on a miss.
+    """
+    try:
+        with open(os.path.join(CACHE_DIR, f"{key}.json"), 'rb') as f:
+            return _json_loads(f.read())["content"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+def cache_store(key: str, content: str):
+    """
+    Atomically writes a completion to the cache; failures are ignored.
+    """
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_json_dumps({"content": content}))
+        os.replace(tmp, os.path.join(CACHE_DIR, f"{key}.json"))
+    except OSError as e:
+        print(f"Warning: could not write response cache: {e}", file=sys.stderr)
+
+def read_streamed_content(response: requests.Response) -> str:
+    """
+    Collects the text deltas of a streamed (server-sent events) chat completion.
+    """
+    buf = io.StringIO()
+    for line in response.iter_lines():
+        if not line.startswith(b"data: "):
+            continue
+        payload = line[6:]
+        if payload == b"[DONE]":
+            break
+        if b'"content"' not in payload:
+            continue  # role, finish and usage frames carry no text
+        delta = _json_loads(payload)["choices"][0].get("delta", {})
+        buf.write(delta.get("content") or "")
+    return buf.getvalue()
+
 def generate_design_document(description: str,
                   context: Optional[str] = None,
                   files: Optional[List[str]] = None,
                   language: str = "Python3",
-                  model: str = "grok-4-latest") -> Optional[str]:
+                  model: str = "grok-4-latest",
+                  cache: bool = True,
+                  max_tokens: Optional[int] = None) -> Optional[str]:
     """
     Generates code based on a natural language description using the Grok API,
     optionally including additional context and file contents.
@@ -36,6 +137,8 @@ def generate_design_document(description: str,
         context (Optional[str]): Additional textual context to provide to the model.
         files (Optional[List[str]]): List of file paths whose contents to include as context.
         model (str): The Grok model to use (default: "grok-4-latest").
+        cache (bool): Reuse a cached completion for an identical deterministic request.
+        max_tokens (Optional[int]): Cap on the completion length; None leaves it to the API.
  
     Returns:
         Optional[str]: The generated code as a string, or None if an error occurs.
@@ -98,9 +201,11 @@ def generate_design_document(description: str,
     user_prompt_parts = []
  
     if files:
+        # Read concurrently so slow disks overlap; results keep the given order
+        with ThreadPoolExecutor(max_workers=min(32, len(files))) as ex:
+            contents = list(ex.map(read_file_content, files))
         file_contexts = []
-        for filepath in files:
-            content = read_file_content(filepath)
+        for filepath, content in zip(files, contents):
             if content is not None:
                 filename = os.path.basename(filepath)
                 file_contexts.append(f"File: {filename}\n{content}\n")
@@ -122,14 +227,24 @@ def generate_design_document(description: str,
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ],
-        "stream": False
+        # Near-deterministic sampling, so a cached design stands in for a fresh one
+        "temperature": 0.1,
+        "stream": True
     }
+    if max_tokens:
+        data["max_tokens"] = max_tokens
+ 
+    cacheable = cache and data["temperature"] <= 0.1
+    key = cache_key(data) if cacheable else None
  
     try:
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status() # Raises an HTTPError for bad responses
-        result = response.json()
-        generated_content = result["choices"][0]["message"]["content"].strip()
+        generated_content = cache_lookup(key) if cacheable else None
+        if generated_content is None:
+            response = _SESSION.post(url, headers=headers, data=_json_dumps(data), stream=True)
+            response.raise_for_status() # Raises an HTTPError for bad responses
+            generated_content = read_streamed_content(response).strip()
+            if cacheable and generated_content:
+                cache_store(key, generated_content)
      
         # Strip markdown code fences if present
         lines = generated_content.splitlines()
@@ -150,57 +265,96 @@ def generate_design_document(description: str,
         print(f"ValueError: {e}")
         return None
 
+def parse_uses(value: str) -> List[str]:
+    """
+    Splits a 'Uses:' value into short module names.
+    """
+    uses_str = value.strip()
+    return [u.strip() for u in uses_str.split(',')] if uses_str else []
+
+# Header lines of a module file: 'Key: value' -> (field, parser for value)
+MODULE_FIELDS = {
+    'Module': ('title', str.strip),
+    'Short': ('short', str.strip),
+    'Uses': ('uses', parse_uses),
+}
+
 def parse_module_file(filename: str) -> dict:
     """
     Parses the module design file to extract title, short, uses, and description.
     """
-    with open(filename, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-  
     module = {}
     desc_lines = []
     in_desc = False
-    uses = []
   
-    for line in lines:
-        line = line.rstrip('\n')
-        if line.startswith('Module: '):
-            module['title'] = line[8:].strip()
-        elif line.startswith('Short: '):
-            module['short'] = line[7:].strip()
-            in_desc = True
-        elif line.startswith('Uses: '):
-            uses_str = line[6:].strip()
-            if uses_str:
-                uses = [u.strip() for u in uses_str.split(',')]
-            module['uses'] = uses
-        elif in_desc:
-            desc_lines.append(line)
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            # One split per line classifies it as a header or description text
+            key, sep, value = line.partition(': ')
+            field = MODULE_FIELDS.get(key) if sep else None
+            if field:
+                name, parse = field
+                module[name] = parse(value)
+                # The description follows the Short: line
+                in_desc = in_desc or name == 'short'
+            elif in_desc:
+                desc_lines.append(line)
   
     module['description'] = '\n'.join(desc_lines).strip()
     return module
 
+def sidecar_matches(filename: str, digest: str) -> bool:
+    """
+    True if filename's .sha256 sidecar records digest and the file has not
+    been modified since the sidecar was written.
+    """
+    try:
+        with open(filename + '.sha256', 'r') as f:
+            recorded, mtime_ns, size = f.read().split()
+        st = os.stat(filename)
+    except (OSError, ValueError):
+        return False
+    return recorded == digest and int(mtime_ns) == st.st_mtime_ns and int(size) == st.st_size
+
+def write_sidecar(filename: str, digest: str):
+    """
+    Records the content hash of filename next to it, with its current mtime and size.
+    """
+    st = os.stat(filename)
+    with open(filename + '.sha256', 'w') as f:
+        f.write(f"{digest} {st.st_mtime_ns} {st.st_size}\n")
+
 def write_if_changed(filename: str, content: str) -> bool:
     """
     Writes content to filename only if it differs from existing content or file doesn't exist.
+    An up-to-date .sha256 sidecar settles the unchanged case without reading the file.
     Returns True if written.
     """
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    if sidecar_matches(filename, digest):
+        return False
+  
     if os.path.exists(filename):
         with open(filename, 'r', encoding='utf-8') as f:
             existing = f.read().strip()
         if existing == content:
+            write_sidecar(filename, digest)
             return False
   
     with open(filename, 'w', encoding='utf-8') as f:
         f.write(content)
+    write_sidecar(filename, digest)
     return True
 
 def touch_file(filename: str):
     """
-    Touches the file to update its timestamp.
+    Touches the file to update its timestamp, creating it if missing.
     """
-    with open(filename, 'a') as f:
-        pass
+    try:
+        os.utime(filename, None)
+    except FileNotFoundError:
+        open(filename, 'a').close()
 
 def main():
     parser = argparse.ArgumentParser(
@@ -226,6 +380,14 @@ def main():
         "--model", type=str, default="grok-4-1-fast-reasoning",
         help="The Grok model to use (default: grok-4-1-fast-reasoning)"
     )
+    parser.add_argument(
+        "--cache", action=argparse.BooleanOptionalAction, default=True,
+        help="Reuse cached responses for identical requests from ~/.cache/vibetools (default: on)."
+    )
+    parser.add_argument(
+        "--max_tokens", type=int, default=None,
+        help="Cap the length of the generated document (default: no cap)."
+    )
   
     args = parser.parse_args()
  
@@ -235,7 +397,9 @@ def main():
         context=args.context,
         files=args.files,
         language=args.language,
-        model=args.model
+        model=args.model,
+        cache=args.cache,
+        max_tokens=args.max_tokens
     )
 
     if design_document:
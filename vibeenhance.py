@@ -1,31 +1,148 @@
 #!/usr/bin/python3
 import argparse
 import os
+import sys
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import subprocess
 import shlex
 import re
 import json
+import io
+import hashlib
+import tempfile
+import stat
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+    def _json_dumps(obj):
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+# Same retry policy as vibecl.py, which documents it.
+_RETRY_OPTIONS = dict(total=5, backoff_factor=1.0,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset({"POST"}),
+                      respect_retry_after_header=True,
+                      raise_on_status=False)
+try:
+    _RETRY = Retry(backoff_jitter=1.0, **_RETRY_OPTIONS)
+except TypeError:
+    _RETRY = Retry(**_RETRY_OPTIONS)
+
+# Shared session: keep-alive reuses the TLS connection across API calls.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4, pool_maxsize=4,
+    max_retries=_RETRY))
+
+# One updated file in the response: File: name, then a fenced block.
+_FILE_BLOCK_RE = re.compile(r'File:\s*([^\n]+?)\s*```\s*(.*?)```', re.DOTALL)
+
+# Completions for deterministic requests are cached here, keyed by request hash.
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vibetools")
+
+def cache_key(data):
+    """Hash the parts of a request body that determine its completion."""
+    canonical = json.dumps([data["model"], data["messages"], data.get("temperature", 0),
+                            data.get("max_tokens")],
+                           sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def cache_lookup(key):
+    """Return the cached completion for key, or None on a miss."""
+    try:
+        with open(os.path.join(CACHE_DIR, f"{key}.json"), 'rb') as f:
+            return _json_loads(f.read())["content"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+def cache_store(key, content):
+    """Atomically write a completion to the cache; failures are ignored."""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_json_dumps({"content": content}))
+        os.replace(tmp, os.path.join(CACHE_DIR, f"{key}.json"))
+    except OSError as e:
+        print(f"Warning: could not write response cache: {e}", file=sys.stderr)
+
+def _read_one(path):
+    """Read one file; None if it does not exist."""
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
 
 def read_files(files):
-    """Read the contents of the files into a dictionary {filename: content}."""
+    """Read the contents of the files into a dictionary {filename: content}.
+    Files are read concurrently so slow disks overlap."""
+    if not files:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(16, len(files))) as ex:
+        results = list(ex.map(_read_one, files))
     contents = {}
-    for f in files:
-        if os.path.exists(f):
-            with open(f, 'r', encoding='utf-8') as file:
-                contents[f] = file.read()
-        else:
+    for f, content in zip(files, results):
+        if content is None:
             print(f"Warning: File {f} does not exist.")
-            contents[f] = ""  # Empty if missing
+            content = ""  # Empty if missing
+        contents[f] = content
     return contents
 
-def format_files_for_prompt(files_dict):
-    """Format files as code blocks for the prompt."""
-    formatted = ""
+def iter_streamed_content(response):
+    """Yield the text deltas of a streamed (server-sent events) chat completion."""
+    for line in response.iter_lines():
+        if not line.startswith(b"data: "):
+            continue
+        payload = line[6:]
+        if payload == b"[DONE]":
+            break
+        if b'"content"' not in payload:
+            continue  # role, finish and usage frames carry no text
+        delta = _json_loads(payload)["choices"][0].get("delta", {})
+        text = delta.get("content")
+        if text:
+            yield text
+
+def read_streamed_content(response):
+    """Collect the text deltas of a streamed (server-sent events) chat completion."""
+    buf = io.StringIO()
+    for text in iter_streamed_content(response):
+        buf.write(text)
+    return buf.getvalue()
+
+def file_digest(content):
+    """sha256 of a file's text, used to tell which files the model already has."""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def format_files_for_prompt(files_dict, known_hashes=None):
+    """Format files as code blocks for the prompt.
+    Files whose hash is in known_hashes are already in full in the previous
+    exchange and are named with their hash instead of being sent again.
+    Returns (prompt text, {filename: sha256} of the files sent in full)."""
+    known_hashes = known_hashes or {}
+    parts = []
+    unchanged = []
+    sent = {}
     for filename, content in files_dict.items():
-        print(f"File: {filename}")
-        formatted += f"File: {filename}\n```\n{content}\n```\n\n"
-    return formatted
+        digest = file_digest(content)
+        if known_hashes.get(filename) == digest:
+            unchanged.append(filename)
+            parts.append(f"File: {filename} (unchanged, sha={digest[:12]})\n\n")
+        else:
+            sent[filename] = digest
+            parts.append(f"File: {filename}\n```\n{content}\n```\n\n")
+    print(f"Files: {', '.join(files_dict)}")
+    if unchanged:
+        print(f"Unchanged since the model last saw them: {', '.join(unchanged)}")
+    return "".join(parts), sent
 
 def parse_fixed_files(content):
     """Parse the API response to extract fixed file contents.
@@ -34,19 +151,60 @@ def parse_fixed_files(content):
     """
     files = {}
     # Find all blocks
-    pattern = r'File:\s*([^\n]+?)\s*```\s*(.*?)```'
-    matches = re.findall(pattern, content, re.DOTALL | re.MULTILINE)
-    for filename, fixed_content in matches:
+    for filename, fixed_content in _FILE_BLOCK_RE.findall(content):
         filename = filename.strip()
         fixed_content = fixed_content.strip()
         files[filename] = fixed_content
     return files
 
+def stream_fixed_files(chunks, on_file):
+    """Parse updated files out of streamed response text as it arrives.
+    Calls on_file(filename, content) as soon as each closing fence is seen,
+    so files are written while the rest is still being generated.
+    Returns the full response text.
+    """
+    text = io.StringIO()
+    buf = ""
+    for chunk in chunks:
+        text.write(chunk)
+        buf += chunk
+        # A block can only complete on a chunk carrying part of its fence.
+        if '`' not in chunk:
+            continue
+        pos = 0
+        while True:
+            match = _FILE_BLOCK_RE.search(buf, pos)
+            if not match:
+                break
+            on_file(match.group(1).strip(), match.group(2).strip())
+            pos = match.end()
+        if pos:
+            buf = buf[pos:]
+    return text.getvalue()
+
+def _atomic_write(item):
+    """Write one file via filename.tmp and os.replace, keeping the old file's mode."""
+    filename, content = item
+    tmp = filename + '.tmp'
+    with open(tmp, 'w', encoding='utf-8', buffering=1 << 20) as file:
+        file.write(content)
+    try:
+        os.chmod(tmp, stat.S_IMODE(os.stat(filename).st_mode))
+    except FileNotFoundError:
+        pass
+    os.replace(tmp, filename)
+    return filename
+
 def write_fixed_files(files_dict):
-    """Write the fixed contents back to files, overwriting."""
-    for filename, content in files_dict.items():
-        with open(filename, 'w', encoding='utf-8') as file:
-            file.write(content)
+    """Write the fixed contents back to files, overwriting.
+    Each file is replaced atomically, so a crash never leaves one truncated;
+    several files are written concurrently."""
+    if len(files_dict) > 1:
+        with ThreadPoolExecutor(max_workers=min(16, len(files_dict))) as ex:
+            written = list(ex.map(_atomic_write, files_dict.items()))
+    else:
+        written = [_atomic_write(item) for item in files_dict.items()]
+    for filename in written:
         print(f"Updated {filename}")
 
 def main():
@@ -56,6 +214,8 @@ def main():
     parser.add_argument('--model', type=str, default="grok-4-1-fast-non-reasoning", help="Model to use for API calls")
     parser.add_argument('--enhance', type=str, default="Analyze what code does and add new features to it that you think would be broadly useful.", help="Describe how the code should be changed.")
     parser.add_argument('--suggest_only', type=bool, default=False, help="Suggest changes only, do not actually make them.")
+    parser.add_argument('--max_tokens', type=int, default=None, help="Cap the length of the response (default: 2048 with --suggest_only, otherwise no cap)")
+    parser.add_argument('--cache', action=argparse.BooleanOptionalAction, default=True, help="Reuse cached responses for identical requests from ~/.cache/vibetools")
     args = parser.parse_args()
 
     api_key = os.getenv('XAI_API_KEY')
@@ -63,15 +223,30 @@ def main():
         print("Error: XAI_API_KEY environment variable not set.")
         return
 
+    # Later iterations carry only the previous exchange, not the whole
+    # conversation; files whose full text is in it (by hash) are not sent again,
+    # so each request holds about one copy of each file.
+    messages = []
+    known_hashes = {}
     for iteration in range(args.max_iterations):
         print(f"\n--- Iteration {iteration + 1} ---")
         # Read current files
         files_dict = read_files(args.files)
         
         # Prompt for Grok
-        files_formatted = format_files_for_prompt(files_dict)
+        files_formatted, sent_hashes = format_files_for_prompt(files_dict, known_hashes)
 
-        if not args.suggest_only:
+        if messages:
+            prompt = f"""
+Improve the source code further as follows: {args.enhance}
+
+Respond ONLY with the updated files, in the same format as before.
+
+Here are the source files to work on.  Files marked unchanged are exactly as you last saw them:
+
+{files_formatted}
+"""
+        elif not args.suggest_only:
             prompt = f"""
 You are an expert software engineer.
 Your task is to improve this source code as follows: {args.enhance}
@@ -104,6 +279,7 @@ Here are the source files to work on:
 {files_formatted}
 """
 
+        content = ""
         try:
             url = "https://api.x.ai/v1/chat/completions"
             headers = {
@@ -112,26 +288,54 @@ Here are the source files to work on:
             }
             data = {
                 "model": args.model,
-                "messages": [{"role": "user", "content": prompt}],
+                "messages": messages + [{"role": "user", "content": prompt}],
                 "temperature": 0.1,
+                "stream": True,
             }
-            print(f"Sending request with model: {args.model}")  # Debug info
-            response = requests.post(url, headers=headers, json=data, timeout=240)
-            response.raise_for_status()
-            resp_json = response.json()
-            content = resp_json["choices"][0]["message"]["content"]
+            # A list of 25 one-line ideas is short; whole-file rewrites must not be cut off
+            max_tokens = args.max_tokens or (2048 if args.suggest_only else None)
+            if max_tokens:
+                data["max_tokens"] = max_tokens
+            cacheable = args.cache and data["temperature"] <= 0.1
+            key = cache_key(data) if cacheable else None
+            cached = cache_lookup(key) if cacheable else None
+            if cached is not None:
+                print("Using cached response")
+                content = cached
+                fixed_files = {}
+                if not args.suggest_only:
+                    # Parse fixed files and write back
+                    fixed_files = parse_fixed_files(content)
+                    write_fixed_files(fixed_files)
+            else:
+                print(f"Sending request with model: {args.model}")  # Debug info
+                response = _SESSION.post(url, headers=headers, data=_json_dumps(data), timeout=240, stream=True)
+                response.raise_for_status()
+                fixed_files = {}
+                if args.suggest_only:
+                    content = read_streamed_content(response)
+                else:
+                    # Write each updated file back as soon as it has streamed in
+                    def write_one(filename, file_content):
+                        fixed_files[filename] = file_content
+                        write_fixed_files({filename: file_content})
+                    content = stream_fixed_files(iter_streamed_content(response), write_one)
+                if cacheable and content:
+                    cache_store(key, content)
             print(f"API response length: {len(content)} characters")
             if args.suggest_only:
                 print(content)
                 break
-            # Parse fixed files
-            fixed_files = parse_fixed_files(content)
             print(f"Parsed {len(fixed_files)} updated files")
             if not fixed_files:
                 raise ValueError("No updated files parsed from response")
-            # Write back
-            write_fixed_files(fixed_files)
             print("Files updated by Grok...")
+            messages = [{"role": "user", "content": prompt},
+                        {"role": "assistant", "content": content}]
+            # Files only marked unchanged in this prompt were in full in the exchange just dropped
+            known_hashes = dict(sent_hashes)
+            for filename, file_content in fixed_files.items():
+                known_hashes[filename] = file_digest(file_content)
         except requests.exceptions.HTTPError as he:
             if response.status_code == 404:
                 print(f"404 error likely due to invalid model '{args.model}'. Valid models: grok-4-1-fast-reasoning, grok-4-1-fast-non-reasoning, grok-4-fast-reasoning, grok-4-fast-non-reasoning, grok-code-fast-1, grok-4")
@@ -151,13 +355,11 @@ Here are the source files to work on:
             break
         except (json.JSONDecodeError, KeyError, ValueError) as e:
             print(f"Error processing API response: {e}")
-            # Optionally, save raw response for debugging
-            try:
+            # Optionally, save the streamed response text for debugging
+            if content:
                 with open('debug_response.txt', 'w') as f:
-                    f.write(response.text)
+                    f.write(content)
                 print("Raw response saved to debug_response.txt for inspection.")
-            except NameError:
-                pass  # No response object
             print("Aborting enhance.")
             break
         except Exception as e:
@@ -3,36 +3,43 @@ import sys
 import os
 import subprocess
 import argparse
+import hashlib
+
+def parse_uses(value):
+    uses_str = value.strip()
+    return [u.strip() for u in uses_str.split(',')] if uses_str else []
+
+# Header lines inside a module: 'Key: value' -> (field, parser for value)
+MODULE_FIELDS = {
+    'Short': ('short', str.strip),
+    'Uses': ('uses', parse_uses),
+}
 
 def parse_design_document(filename):
-    with open(filename, 'r') as f:
-        lines = f.readlines()
-  
     modules = []
     current = None
     desc_lines = []
   
-    for line in lines:
-        line = line.rstrip('\n')
-        if line.startswith('Module: '):
-            if current is not None:
-                current['description'] = '\n'.join(desc_lines)
-                modules.append(current)
-            current = {
-                'title': line[8:].strip()
-            }
-            desc_lines = []
-        elif current is not None:
-            if line.startswith('Short: '):
-                current['short'] = line[7:].strip()
-            elif line.startswith('Uses: '):
-                uses_str = line[6:].strip()
-                if uses_str:
-                    current['uses'] = [u.strip() for u in uses_str.split(',')]
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            # One split per line classifies it as a header or description text
+            key, sep, value = line.partition(': ')
+            if sep and key == 'Module':
+                if current is not None:
+                    current['description'] = '\n'.join(desc_lines)
+                    modules.append(current)
+                current = {
+                    'title': value.strip()
+                }
+                desc_lines = []
+            elif current is not None:
+                field = MODULE_FIELDS.get(key) if sep else None
+                if field:
+                    name, parse = field
+                    current[name] = parse(value)
                 else:
-                    current['uses'] = []
-            else:
-                desc_lines.append(line)
+                    desc_lines.append(line)
   
     if current is not None:
         current['description'] = '\n'.join(desc_lines)
@@ -40,6 +47,23 @@ def parse_design_document(filename):
   
     return modules
 
+def sidecar_matches(filename, digest):
+    """True if filename's .sha256 sidecar records digest and the file has not
+    been modified since the sidecar was written."""
+    try:
+        with open(filename + '.sha256', 'r') as f:
+            recorded, mtime_ns, size = f.read().split()
+        st = os.stat(filename)
+    except (OSError, ValueError):
+        return False
+    return recorded == digest and int(mtime_ns) == st.st_mtime_ns and int(size) == st.st_size
+
+def write_sidecar(filename, digest):
+    """Record the content hash of filename next to it, with its current mtime and size."""
+    st = os.stat(filename)
+    with open(filename + '.sha256', 'w') as f:
+        f.write(f"{digest} {st.st_mtime_ns} {st.st_size}\n")
+
 def generate_module_file(module, build_dir, overwrite_if_same=True):
     short = module['short']
     filename = os.path.join(build_dir, f"{short}.txt")
@@ -49,41 +73,43 @@ def generate_module_file(module, build_dir, overwrite_if_same=True):
         content += f"Uses: {', '.join(module['uses'])}\n"
     content += f"\n{module['description']}"
   
+    # The sidecar hash answers the common unchanged case without reading the file
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    if sidecar_matches(filename, digest):
+        return # No change, skip write to preserve timestamp
+  
     if os.path.exists(filename):
         with open(filename, 'r') as f:
             existing_content = f.read()
         if existing_content == content:
+            write_sidecar(filename, digest)
             return # No change, skip write to preserve timestamp
         # If not same, proceed to overwrite
   
     with open(filename, 'w') as f:
         f.write(content)
+    write_sidecar(filename, digest)
 
 def generate_makefile(top_level, modules, build_dir, model=None, overwrite_if_same=True):
     all_shorts = [m['short'] for m in modules]
     all_built = [s + '.built' for s in all_shorts]
   
     makefile_content = '.PHONY: all\n\n'
+    makefile_content += f"TOP := ../{top_level}\n"
+    makefile_content += f"MODEL := {model or ''}\n\n"
     makefile_content += f"all: {' '.join(all_built)}\n\n"
   
+    # One recipe for every module; each module only contributes its
+    # dependency list (USES_<short>) and its prerequisites.
+    makefile_content += "%.built: %.txt\n"
+    makefile_content += "\tvibecl.py --description $*.txt --complete $(TOP)$(if $(MODEL), --model $(MODEL))$(if $(USES_$*), --files $(USES_$*))\n\n"
+  
     for module in modules:
         short = module['short']
         uses = module.get('uses', [])
-        uses_built = [u + '.built' for u in uses]
-        uses_source = [u + '.py' for u in uses]
-      
-        target_deps = [f"{short}.txt"]
-        if uses_built:
-            target_deps.extend(uses_built)
-      
-        makefile_content += f"{short}.built: {' '.join(target_deps)}\n"
-        cmd = f"vibecl.py --description {short}.txt --complete ../{top_level}"
-        if model:
-            cmd += f" --model {model}"
-        if uses_source:
-            cmd += f" --files {' '.join(uses_source)}"
-
-        makefile_content += f"\t{cmd}\n\n"
+        if uses:
+            makefile_content += f"USES_{short} := {' '.join(u + '.py' for u in uses)}\n"
+            makefile_content += f"{short}.built: {' '.join(u + '.built' for u in uses)}\n"
   
     filename = os.path.join(build_dir, 'Makefile')
     if os.path.exists(filename) and overwrite_if_same:
@@ -99,6 +125,8 @@ def main():
     parser = argparse.ArgumentParser(description="Generate module files and Makefile from a design document.")
     parser.add_argument("design_file", help="Path to the design document file.")
     parser.add_argument("--model", type=str, default=None, help="Grok model to use for code generation (passed to vibecl.py).")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Number of modules to build in parallel (default: up to 8).")
+    parser.add_argument("--bulk", type=int, default=None, help="Build with vibecl.py's batch mode instead of make, requesting up to this many new modules per API call.")
     args = parser.parse_args()
   
     design_file = args.design_file
@@ -128,12 +156,24 @@ def main():
   
     print(f"Generated {len(modules)} module files and Makefile in {build_dir}/")
    
-    print("Running make...")
+    # Independent modules build concurrently; the default cap keeps within API rate limits
+    jobs = args.jobs if args.jobs else min(8, len(modules))
+    if args.bulk and args.bulk > 1:
+        # vibecl.py walks the same dependency waves as make, but sends the new
+        # modules of each wave in shared requests instead of one call apiece
+        command = ['vibecl.py', '--description', '.', '--complete', f"../{design_file}",
+                   '--bulk', str(args.bulk), '--concurrency', str(jobs)]
+        if model:
+            command += ['--model', model]
+        print(f"Running vibecl.py --bulk {args.bulk}...")
+    else:
+        command = ['make', '-j', str(jobs), 'all']
+        print(f"Running make -j {jobs}...")
     try:
-        subprocess.run(['make', 'all'], cwd=build_dir, check=True)
+        subprocess.run(command, cwd=build_dir, check=True)
         print("Build complete.")
     except subprocess.CalledProcessError as e:
-        print(f"Make failed with exit code {e.returncode}", file=sys.stderr)
+        print(f"Build failed with exit code {e.returncode}", file=sys.stderr)
         sys.exit(1)
 
 if __name__ == '__main__':
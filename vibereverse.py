@@ -2,29 +2,116 @@
 import argparse
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import subprocess
 import shlex
 import re
 import json
+import sys
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+    def _json_dumps(obj):
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+# Same retry policy as vibecl.py, which documents it.
+_RETRY_OPTIONS = dict(total=5, backoff_factor=1.0,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset({"POST"}),
+                      respect_retry_after_header=True,
+                      raise_on_status=False)
+try:
+    _RETRY = Retry(backoff_jitter=1.0, **_RETRY_OPTIONS)
+except TypeError:
+    _RETRY = Retry(**_RETRY_OPTIONS)
+
+# Shared session: keep-alive reuses the TLS connection across API calls.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4, pool_maxsize=4,
+    max_retries=_RETRY))
+
+# Completions for deterministic requests are cached here, keyed by request hash.
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vibetools")
+
+def cache_key(data):
+    """Hash the parts of a request body that determine its completion."""
+    canonical = json.dumps([data["model"], data["messages"], data.get("temperature", 0),
+                            data.get("max_tokens")],
+                           sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def cache_lookup(key):
+    """Return the cached completion for key, or None on a miss."""
+    try:
+        with open(os.path.join(CACHE_DIR, f"{key}.json"), 'rb') as f:
+            return _json_loads(f.read())["content"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+def cache_store(key, content):
+    """Atomically write a completion to the cache; failures are ignored."""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_json_dumps({"content": content}))
+        os.replace(tmp, os.path.join(CACHE_DIR, f"{key}.json"))
+    except OSError as e:
+        print(f"Warning: could not write response cache: {e}", file=sys.stderr)
+
+def _read_one(path):
+    """Read one file; None if it does not exist."""
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
 
 def read_files(files):
-    """Read the contents of the files into a dictionary {filename: content}."""
+    """Read the contents of the files into a dictionary {filename: content}.
+    Files are read concurrently so slow disks overlap."""
+    if not files:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(16, len(files))) as ex:
+        results = list(ex.map(_read_one, files))
     contents = {}
-    for f in files:
-        if os.path.exists(f):
-            with open(f, 'r', encoding='utf-8') as file:
-                contents[f] = file.read()
-        else:
+    for f, content in zip(files, results):
+        if content is None:
             print(f"Warning: File {f} does not exist.")
-            contents[f] = ""  # Empty if missing
+            content = ""  # Empty if missing
+        contents[f] = content
     return contents
 
+def iter_streamed_content(response):
+    """Yield the text deltas of a streamed (server-sent events) chat completion."""
+    for line in response.iter_lines():
+        if not line.startswith(b"data: "):
+            continue
+        payload = line[6:]
+        if payload == b"[DONE]":
+            break
+        if b'"content"' not in payload:
+            continue  # role, finish and usage frames carry no text
+        delta = _json_loads(payload)["choices"][0].get("delta", {})
+        text = delta.get("content")
+        if text:
+            yield text
+
 def format_files_for_prompt(files_dict):
     """Format files as code blocks for the prompt."""
-    formatted = ""
+    parts = []
     for filename, content in files_dict.items():
-        formatted += f"File: {filename}\n\n{content}\n\n\n"
-    return formatted
+        parts.append(f"File: {filename}\n\n{content}\n\n\n")
+    return "".join(parts)
 
 def main():
     parser = argparse.ArgumentParser(description="Reverse engineer a design document from code.")
@@ -34,6 +121,8 @@ def main():
         "--language", type=str, default="Python3.12",
         help="Assume the design document is for a program written in a given language."
     )
+    parser.add_argument('--max_tokens', type=int, default=None, help="Cap the length of the design document (default: no cap)")
+    parser.add_argument('--cache', action=argparse.BooleanOptionalAction, default=True, help="Reuse cached responses for identical requests from ~/.cache/vibetools")
     args = parser.parse_args()
 
     api_key = os.getenv('XAI_API_KEY')
@@ -99,6 +188,8 @@ the same language that the design document is targetting.
 {files_formatted}
 
 """
+    content = ""
+    parts = []  # Text streamed so far, kept if the stream breaks off
     try:
         url = "https://api.x.ai/v1/chat/completions"
         headers = {
@@ -109,12 +200,28 @@ the same language that the design document is targetting.
             "model": args.model,
             "messages": [{"role": "user", "content": prompt}],
             "temperature": 0.1,
+            "stream": True,
         }
-        response = requests.post(url, headers=headers, json=data, timeout=240)
-        response.raise_for_status()
-        resp_json = response.json()
-        content = resp_json["choices"][0]["message"]["content"]
-        print(content)
+        if args.max_tokens:
+            data["max_tokens"] = args.max_tokens
+        cacheable = args.cache and data["temperature"] <= 0.1
+        key = cache_key(data) if cacheable else None
+        cached = cache_lookup(key) if cacheable else None
+        if cached is not None:
+            content = cached
+            print(content)
+        else:
+            response = _SESSION.post(url, headers=headers, data=_json_dumps(data), timeout=240, stream=True)
+            response.raise_for_status()
+            # Print the document as it is generated
+            for text in iter_streamed_content(response):
+                parts.append(text)
+                sys.stdout.write(text)
+                sys.stdout.flush()
+            content = "".join(parts)
+            print()
+            if cacheable and content:
+                cache_store(key, content)
     except requests.exceptions.HTTPError as he:
         if response.status_code == 404:
             print(f"404 error likely due to invalid model '{args.model}'. Valid models: grok-4-1-fast-reasoning, grok-4-1-fast-non-reasoning, grok-4-fast-reasoning, grok-4-fast-non-reasoning, grok-code-fast-1, grok-4")
@@ -131,13 +238,12 @@ the same language that the design document is targetting.
         print("Aborting reverse.")
     except (json.JSONDecodeError, KeyError, ValueError) as e:
         print(f"Error processing API response: {e}")
-        # Optionally, save raw response for debugging
-        try:
+        # Optionally, save the streamed response text for debugging
+        content = content or "".join(parts)
+        if content:
             with open('debug_response.txt', 'w') as f:
-                f.write(response.text)
+                f.write(content)
             print("Raw response saved to debug_response.txt for inspection.")
-        except NameError:
-            pass  # No response object
         print("Aborting reverse.")
     except Exception as e:
         print(f"Unexpected error: {e}")